@@ -2,7 +2,7 @@
 
 import { useState, useEffect } from 'react';
 import { useRouter } from 'next/navigation'; // Para redirecionamento se o token for inválido
-import { apiService } from '../../services/apiService'; // Importa o serviço de API
+import { apiService, AssetChange } from '../../services/apiService'; // Importa o serviço de API
 
 interface Asset { // Define a interface para um ativo
   id: number;
@@ -64,7 +64,35 @@ export default function Dashboard() {
       }
     };
 
+    // Aplica as mudanças recebidas pelo feed em vez de reconsultar a lista inteira
+    const applyChange = (change: AssetChange) => {
+      if (change.event_type === 'deleted') {
+        setAssets(prev => prev.filter(asset => asset.id !== change.asset_id));
+        return;
+      }
+      const assignedTo = change.assigned_to === null ? null : String(change.assigned_to);
+      if (change.event_type === 'status_changed') {
+        setAssets(prev => prev.map(asset =>
+          asset.id === change.asset_id ? { ...asset, status: change.status, assignedTo } : asset
+        ));
+        return;
+      }
+      // 'created' e 'updated' trazem os campos gravados no próprio evento: nada é buscado de novo
+      const fields = { ...(change.changes ?? {}), status: change.status, assignedTo };
+      setAssets(prev => {
+        if (prev.some(asset => asset.id === change.asset_id)) {
+          return prev.map(asset => (asset.id === change.asset_id ? ({ ...asset, ...fields } as Asset) : asset));
+        }
+        if (change.event_type !== 'created') {
+          return prev; // Ativo fora da lista carregada: aparece na próxima recarga
+        }
+        return [...prev, { id: change.asset_id, ...fields, created_at: change.changed_at } as unknown as Asset];
+      });
+    };
+
     fetchAssetsData(); // Chama a função assim que o componente é montado
+    const unsubscribe = apiService.subscribeAssetChanges(applyChange, fetchAssetsData);
+    return unsubscribe; // Fecha a conexão do feed ao desmontar o componente
   }, [router]); // Adiciona router como dependência para o ESLint
 
   const handleLogout = () => {
@@ -99,7 +127,7 @@ export default function Dashboard() {
       await apiService.checkoutAsset(checkoutData);
       alert('Ativo designado com sucesso!');
       closeCheckoutModal();
-      fetchAssetsData(); // Descomente se quiser atualizar automaticamente
+      // A lista é atualizada pelo feed de mudanças quando o checkout for processado
     } catch (err: any) {
       console.error("Erro ao designar ativo:", err);
       let errorMessage = 'Erro ao designar o ativo. Por favor, tente novamente.';
@@ -5,6 +5,17 @@ const INVENTORY_BASE_URL = process.env.NEXT_PUBLIC_INVENTORY_BASE_URL || 'http:/
 // Adicione uma variável de ambiente para o lifecycle-service
 const LIFECYCLE_BASE_URL = process.env.NEXT_PUBLIC_LIFECYCLE_BASE_URL || 'http://localhost:3003'; // URL do lifecycle-service
 
+// Delta recebido do feed de mudanças do inventory-service (GET /assets/stream)
+export interface AssetChange {
+  id: number; // Id do evento, usado pelo EventSource para retomar de onde parou
+  asset_id: number;
+  event_type: 'created' | 'updated' | 'status_changed' | 'deleted';
+  status: string;
+  assigned_to: number | null;
+  changes?: Record<string, unknown> | null; // 'created': a linha gravada; 'updated': só os campos que mudaram
+  changed_at: string;
+}
+
 const api = axios.create({
   baseURL: API_BASE_URL,
 });
@@ -30,14 +41,24 @@ export const apiService = {
 
     const inventoryApi = axios.create({
       baseURL: INVENTORY_BASE_URL, // Usa a URL do Serviço de Inventário
+      withCredentials: true, // Envia o cookie de read-your-writes (leituras logo após uma escrita vão ao banco primário)
     });
 
     // Adiciona o token no cabeçalho Authorization para esta requisição específica
     inventoryApi.defaults.headers.common['Authorization'] = `Bearer ${token}`;
 
     try {
-      const response = await inventoryApi.get('/assets/'); // Faz a requisição GET para /assets/
-      return response.data; // Retorna os dados recebidos (a lista de ativos)
+      // A API pagina por cursor: segue `next_cursor` até a última página
+      const assets: any[] = [];
+      let cursor: string | null = null;
+      do {
+        const response: { data: { items: any[]; next_cursor: string | null } } = await inventoryApi.get('/assets/', {
+          params: { limit: 1000, ...(cursor ? { cursor } : {}) },
+        });
+        assets.push(...response.data.items);
+        cursor = response.data.next_cursor;
+      } while (cursor);
+      return assets; // Retorna a lista completa de ativos
     } catch (error: any) {
         // Verifica se o erro é de autenticação (401)
         if (error.response && error.response.status === 401) {
@@ -51,6 +72,17 @@ export const apiService = {
     }
   },
 
+  // Feed de mudanças (SSE): recebe um delta por alteração de ativo em vez de reconsultar a lista.
+  // O EventSource reconecta sozinho e reenvia o último id recebido (Last-Event-ID); `onReset`
+  // avisa que as mudanças perdidas não puderam ser reenviadas e a lista deve ser recarregada.
+  // Retorna a função que encerra a conexão.
+  subscribeAssetChanges: (onChange: (change: AssetChange) => void, onReset: () => void) => {
+    const source = new EventSource(`${INVENTORY_BASE_URL}/assets/stream`);
+    source.addEventListener('asset', (event) => onChange(JSON.parse((event as MessageEvent).data)));
+    source.addEventListener('reset', () => onReset());
+    return () => source.close();
+  },
+
   // Nova função para criar um ativo
   createAsset: async (assetData: { name: string; assetNumber: string; type: string; status: string; departmentId: number }) => {
     const token = localStorage.getItem('access_token'); // Obtém o token do localStorage
@@ -60,6 +92,7 @@ export const apiService = {
 
     const inventoryApi = axios.create({
       baseURL: INVENTORY_BASE_URL, // Usa a URL do Serviço de Inventário
+      withCredentials: true, // Recebe o cookie de read-your-writes desta escrita
     });
 
     // Adiciona o token no cabeçalho Authorization e o Content-Type
@@ -0,0 +1,250 @@
+"""
+Controle de admissão entre o tráfego HTTP e o consumidor de checkout.
+
+A API e o consumidor embutido dividem o mesmo event loop e o mesmo pool de conexões. Cada tipo
+de trabalho tem o seu orçamento de concorrência (semáforo):
+
+    interactive  requisições comuns da API
+    bulk         /assets/bulk e /assets/export, longas e pesadas
+    consumer     lotes do consumidor de checkout
+
+Por padrão a soma dos três cabe no pool (DB_POOL_SIZE + DB_MAX_OVERFLOW), de modo que nenhum
+deles esgota as conexões dos outros. Requisições além do limite esperam numa fila; com a fila
+cheia, ou depois de ADMISSION_QUEUE_TIMEOUT_SECONDS na fila, recebem 429 com Retry-After. O
+consumidor nunca é recusado, só espera; quando a espera pelo pool sobe, o prefetch dos seus
+canais é reduzido para que o broker entregue menos mensagens de uma vez.
+"""
+import asyncio
+import json
+import logging
+import os
+from contextlib import asynccontextmanager, nullcontext
+from typing import Optional
+
+import metrics
+from database import DB_MAX_OVERFLOW, DB_POOL_SIZE
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURAÇÕES DA ADMISSÃO ---
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes")
+ADMISSION_BULK_CONCURRENCY = int(os.getenv("ADMISSION_BULK_CONCURRENCY", "2"))
+ADMISSION_CONSUMER_CONCURRENCY = int(os.getenv("ADMISSION_CONSUMER_CONCURRENCY", "2"))
+# Padrão: o que sobra do pool depois dos outros dois orçamentos
+ADMISSION_INTERACTIVE_CONCURRENCY = int(os.getenv(
+    "ADMISSION_INTERACTIVE_CONCURRENCY",
+    str(max(4, DB_POOL_SIZE + DB_MAX_OVERFLOW - ADMISSION_BULK_CONCURRENCY - ADMISSION_CONSUMER_CONCURRENCY)),
+))
+# Requisições aguardando vaga além das quais as novas são recusadas
+ADMISSION_INTERACTIVE_QUEUE = int(os.getenv("ADMISSION_INTERACTIVE_QUEUE", "200"))
+ADMISSION_BULK_QUEUE = int(os.getenv("ADMISSION_BULK_QUEUE", "10"))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "5"))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "1"))
+
+# --- AJUSTE DO PREFETCH DO CONSUMIDOR ---
+# Espera média pelo pool (ms) acima da qual o prefetch cai pela metade, e abaixo da qual volta
+# a dobrar até CHECKOUT_PREFETCH_COUNT. Depende da instrumentação do pool (METRICS_ENABLED)
+PREFETCH_THROTTLE_ENABLED = os.getenv("CHECKOUT_PREFETCH_THROTTLE_ENABLED", "true").lower() in ("1", "true", "yes")
+PREFETCH_MIN_COUNT = int(os.getenv("CHECKOUT_PREFETCH_MIN_COUNT", "10"))
+POOL_WAIT_HIGH_MS = float(os.getenv("CHECKOUT_PREFETCH_POOL_WAIT_HIGH_MS", "50"))
+POOL_WAIT_LOW_MS = float(os.getenv("CHECKOUT_PREFETCH_POOL_WAIT_LOW_MS", "5"))
+PREFETCH_ADJUST_INTERVAL_SECONDS = float(os.getenv("CHECKOUT_PREFETCH_ADJUST_INTERVAL_SECONDS", "1"))
+
+# Rotas fora da admissão: sondas, métricas, documentação e o feed, cujas conexões são longas e
+# têm limite próprio (CHANGE_FEED_MAX_SUBSCRIBERS)
+EXEMPT_PREFIXES = ("/health/", "/metrics", "/admission/stats", "/assets/stream", "/docs", "/redoc", "/openapi.json")
+BULK_PREFIXES = ("/assets/bulk", "/assets/export")
+
+OVERLOADED_BODY = json.dumps({"detail": "Server overloaded, retry later"}).encode()
+
+
+class Overloaded(Exception):
+    def __init__(self, budget: str, reason: str):
+        super().__init__(f"Orçamento '{budget}' sem vagas ({reason}).")
+        self.budget = budget
+        self.reason = reason
+
+
+class Budget:
+    """
+    Semáforo com fila limitada. `max_queue=None` espera indefinidamente (consumidor).
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: Optional[int] = None, queue_timeout: Optional[float] = None):
+        self.name = name
+        self.limit = max(1, limit)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(self.limit)
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    def _reject(self, reason: str) -> Overloaded:
+        self.rejected += 1
+        metrics.admission_rejected_total.inc(budget=self.name, reason=reason)
+        return Overloaded(self.name, reason)
+
+    async def acquire(self) -> None:
+        """
+        Ocupa uma vaga, esperando na fila se preciso; lança Overloaded se a fila estiver cheia
+        ou a espera passar do limite.
+        """
+        if not self._semaphore.locked():
+            await self._semaphore.acquire() # Há vaga: não espera
+        else:
+            await self._wait()
+        self.active += 1
+        metrics.admission_active.set(self.active, budget=self.name)
+
+    async def _wait(self) -> None:
+        if self.max_queue is not None and self.waiting >= self.max_queue:
+            raise self._reject("queue_full")
+        self.waiting += 1
+        metrics.admission_queue_depth.set(self.waiting, budget=self.name)
+        try:
+            if self.queue_timeout is None:
+                await self._semaphore.acquire()
+            else:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise self._reject("timeout")
+        finally:
+            self.waiting -= 1
+            metrics.admission_queue_depth.set(self.waiting, budget=self.name)
+
+    def release(self) -> None:
+        self.active -= 1
+        metrics.admission_active.set(self.active, budget=self.name)
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_queue": self.max_queue,
+            "rejected": self.rejected,
+        }
+
+
+class Scheduler:
+    def __init__(self):
+        self.interactive = Budget(
+            "interactive", ADMISSION_INTERACTIVE_CONCURRENCY, ADMISSION_INTERACTIVE_QUEUE, ADMISSION_QUEUE_TIMEOUT_SECONDS
+        )
+        self.bulk = Budget("bulk", ADMISSION_BULK_CONCURRENCY, ADMISSION_BULK_QUEUE, ADMISSION_QUEUE_TIMEOUT_SECONDS)
+        self.consumer = Budget("consumer", ADMISSION_CONSUMER_CONCURRENCY)
+
+    def budget_for(self, method: str, path: str) -> Optional[Budget]:
+        if method == "OPTIONS" or path == "/" or path.startswith(EXEMPT_PREFIXES):
+            return None
+        if path.startswith(BULK_PREFIXES):
+            return self.bulk
+        return self.interactive
+
+    def stats(self) -> dict:
+        return {budget.name: budget.stats() for budget in (self.interactive, self.bulk, self.consumer)}
+
+
+def consumer_slot():
+    """
+    Vaga para um lote do consumidor: espera o tempo que for preciso, nunca é recusada.
+    """
+    return scheduler.consumer.slot() if ADMISSION_ENABLED else nullcontext()
+
+
+class AdmissionMiddleware:
+    """
+    Reserva uma vaga do orçamento da rota durante toda a requisição (inclusive o streaming da
+    resposta) ou responde 429 com Retry-After.
+    """
+
+    def __init__(self, app, scheduler: Scheduler, retry_after: int = ADMISSION_RETRY_AFTER_SECONDS):
+        self.app = app
+        self.scheduler = scheduler
+        self.retry_after = retry_after
+
+    async def __call__(self, scope, receive, send):
+        budget = self.scheduler.budget_for(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if budget is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await budget.acquire()
+        except Overloaded:
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(OVERLOADED_BODY)).encode()),
+                    (b"retry-after", str(self.retry_after).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": OVERLOADED_BODY})
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            budget.release()
+
+
+class PrefetchThrottle:
+    """
+    Ajusta o prefetch dos canais do consumidor pela espera média pelo pool na última janela:
+    metade acima de POOL_WAIT_HIGH_MS, o dobro abaixo de POOL_WAIT_LOW_MS, entre
+    PREFETCH_MIN_COUNT e `maximum`.
+
+    O ajuste usa o limite global do canal (basic.qos com global), que o RabbitMQ aplica
+    imediatamente; o limite por consumidor definido ao iniciar o consumo não muda, e vale o
+    menor dos dois.
+    """
+
+    def __init__(self, maximum: int, minimum: int = PREFETCH_MIN_COUNT):
+        self.maximum = maximum
+        self.minimum = max(1, min(minimum, maximum))
+        self.current = maximum
+        self.channels: list = []
+        metrics.consumer_prefetch_count.set(self.current)
+
+    def next_count(self, mean_wait_ms: float) -> int:
+        if mean_wait_ms > POOL_WAIT_HIGH_MS:
+            return max(self.minimum, self.current // 2)
+        if mean_wait_ms < POOL_WAIT_LOW_MS:
+            return min(self.maximum, self.current * 2)
+        return self.current
+
+    async def adjust(self) -> None:
+        _, mean_wait, _ = metrics.pool_wait_window.take()
+        target = self.next_count(mean_wait * 1000)
+        if target == self.current:
+            return
+        results = await asyncio.gather(
+            *(channel.set_qos(prefetch_count=target, global_=True) for channel in self.channels), return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning(f"Falha ao ajustar o prefetch do consumidor: {result}")
+        logger.info(f"Prefetch do consumidor {self.current} → {target} (espera média pelo pool {mean_wait * 1000:.1f}ms).")
+        self.current = target
+        metrics.consumer_prefetch_count.set(target)
+
+    async def run(self, interval: float = PREFETCH_ADJUST_INTERVAL_SECONDS) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.adjust()
+            except Exception as e:
+                logger.error(f"Erro no ajuste do prefetch do consumidor: {e}")
+
+
+scheduler = Scheduler()
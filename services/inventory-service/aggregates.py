@@ -0,0 +1,46 @@
+"""
+Verificação periódica de asset_stats (contagens por status × tipo).
+
+As contagens são mantidas incrementalmente pelas mutações em crud.py; este job recalcula
+a partir de 'assets' e corrige divergências (ex.: escritas feitas fora da API, por scripts).
+"""
+import asyncio
+import logging
+import os
+
+import crud
+from database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURAÇÕES DA VERIFICAÇÃO ---
+STATS_RECONCILE_ENABLED = os.getenv("STATS_RECONCILE_ENABLED", "true").lower() in ("1", "true", "yes")
+# O recálculo faz um GROUP BY em 'assets' (num snapshot, sem bloquear as escritas)
+STATS_RECONCILE_INTERVAL_SECONDS = int(os.getenv("STATS_RECONCILE_INTERVAL_SECONDS", "3600"))
+
+
+async def reconcile_once() -> dict:
+    async with AsyncSessionLocal() as db:
+        drift = await crud.reconcile_asset_stats(db)
+    for (status, asset_type), (stored, actual) in drift.items():
+        logger.warning(f"asset_stats divergente para {status.value}/{asset_type.value}: {stored} -> {actual}")
+    return drift
+
+
+async def run_stats_reconciler() -> None:
+    """
+    Recalcula asset_stats ao assumir as tarefas de manutenção (jobs.py) e depois periodicamente,
+    até a tarefa ser cancelada.
+    """
+    while True:
+        try:
+            await reconcile_once()
+        except Exception as e:
+            logger.error(f"Erro ao verificar asset_stats: {e}")
+        await asyncio.sleep(STATS_RECONCILE_INTERVAL_SECONDS)
+
+
+if __name__ == "__main__":
+    # Permite rodar a verificação isoladamente (ex.: cron)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(reconcile_once())
@@ -12,11 +12,17 @@ from alembic import context
 # Isso é crucial para que o Alembic possa detectar as tabelas e colunas
 # em código Python.
 from models import Base
+# URL do banco da aplicação (variável DATABASE_URL, carregada do .env por database.py)
+from database import DATABASE_URL
 
 # O objeto de configuração do Alembic, que fornece acesso programático
 # aos valores definidos no arquivo alembic.ini.
 config = context.config
 
+# As migrações são a única forma de criar o schema (a API não roda mais create_all), então
+# precisam apontar para o mesmo banco que a aplicação. O "%" é escapado para o ConfigParser.
+config.set_main_option("sqlalchemy.url", DATABASE_URL.replace("%", "%%"))
+
 # Interpreta o arquivo alembic.ini para configurar o sistema de logging do Python.
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
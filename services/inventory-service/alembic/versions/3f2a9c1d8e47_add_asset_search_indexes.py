@@ -0,0 +1,58 @@
+"""AddAssetSearchIndexes
+
+Revision ID: 3f2a9c1d8e47
+Revises: 7d476a1a6505
+Create Date: 2025-11-03 10:12:41.503118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f2a9c1d8e47'
+down_revision: Union[str, Sequence[str], None] = '7d476a1a6505'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (nome, colunas) dos índices B-tree usados pelos filtros de GET /assets/
+BTREE_INDEXES = [
+    ('ix_assets_status_id', ['status', 'id']),
+    ('ix_assets_asset_type_id', ['asset_type', 'id']),
+    ('ix_assets_status_asset_type_id', ['status', 'asset_type', 'id']),
+    ('ix_assets_created_at', ['created_at']),
+    ('ix_assets_updated_at', ['updated_at']),
+]
+
+# Índices GIN trigram para a busca por trecho em name e model
+TRGM_INDEXES = [
+    ('ix_assets_name_trgm', 'name'),
+    ('ix_assets_model_trgm', 'model'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # CREATE INDEX CONCURRENTLY não roda dentro de transação e não bloqueia escritas em 'assets'
+    with op.get_context().autocommit_block():
+        for name, columns in BTREE_INDEXES:
+            op.create_index(name, 'assets', columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+        for name, column in TRGM_INDEXES:
+            op.create_index(
+                name, 'assets', [column], unique=False,
+                postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'},
+                postgresql_concurrently=True, if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, _ in reversed(TRGM_INDEXES):
+            op.drop_index(name, table_name='assets', postgresql_concurrently=True, if_exists=True)
+        for name, _ in reversed(BTREE_INDEXES):
+            op.drop_index(name, table_name='assets', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,29 @@
+"""AddAssetVersion
+
+Revision ID: a3c5e7f9b126
+Revises: f7a9c3e5d214
+Create Date: 2025-11-19 11:26:37.615092
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c5e7f9b126'
+down_revision: Union[str, Sequence[str], None] = 'f7a9c3e5d214'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Com DEFAULT constante o PostgreSQL não reescreve a tabela
+    op.add_column('assets', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('assets', 'version')
@@ -0,0 +1,29 @@
+"""AddAssetEventChanges
+
+Revision ID: b8d2f4a6c917
+Revises: a3c5e7f9b126
+Create Date: 2025-11-24 10:12:48.203117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8d2f4a6c917'
+down_revision: Union[str, Sequence[str], None] = 'a3c5e7f9b126'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Coluna nula sem DEFAULT: o PostgreSQL só altera o catálogo e a propaga às partições
+    op.add_column('asset_events', sa.Column('changes', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('asset_events', 'changes')
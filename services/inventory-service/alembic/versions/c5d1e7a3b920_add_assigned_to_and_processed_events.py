@@ -0,0 +1,44 @@
+"""AddAssignedToAndProcessedEvents
+
+Revision ID: c5d1e7a3b920
+Revises: 8b61e0f4c2d9
+Create Date: 2025-11-12 10:03:41.562917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d1e7a3b920'
+down_revision: Union[str, Sequence[str], None] = '8b61e0f4c2d9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('assets', sa.Column('assigned_to', sa.Integer(), nullable=True))
+    op.create_table('processed_events',
+    sa.Column('message_id', sa.String(), nullable=False),
+    sa.Column('processed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('message_id')
+    )
+    op.create_index(op.f('ix_processed_events_processed_at'), 'processed_events', ['processed_at'], unique=False)
+    # Como em 3f2a9c1d8e47: CREATE INDEX CONCURRENTLY fora da transação, sem bloquear escritas em 'assets'
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_assets_assigned_to_id', 'assets', ['assigned_to', 'id'], unique=False,
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_assets_assigned_to_id', table_name='assets', postgresql_concurrently=True, if_exists=True)
+    op.drop_index(op.f('ix_processed_events_processed_at'), table_name='processed_events')
+    op.drop_table('processed_events')
+    op.drop_column('assets', 'assigned_to')
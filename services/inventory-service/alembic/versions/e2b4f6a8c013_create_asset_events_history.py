@@ -0,0 +1,73 @@
+"""CreateAssetEventsHistory
+
+Revision ID: e2b4f6a8c013
+Revises: c5d1e7a3b920
+Create Date: 2025-11-14 09:41:18.220734
+
+"""
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b4f6a8c013'
+down_revision: Union[str, Sequence[str], None] = 'c5d1e7a3b920'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Partições mensais criadas agora (mês atual + 3); as seguintes ficam com history.py
+MONTHS_AHEAD = 3
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Tabela particionada por mês: a chave primária precisa incluir a coluna de particionamento
+    op.execute("""
+        CREATE TABLE asset_events (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY,
+            asset_id INTEGER NOT NULL,
+            event_type VARCHAR NOT NULL,
+            status assetstatus NOT NULL,
+            assigned_to INTEGER,
+            changed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, changed_at)
+        ) PARTITION BY RANGE (changed_at)
+    """)
+    # Índices no pai são criados em cada partição, inclusive nas futuras
+    op.create_index('ix_asset_events_asset_id_id', 'asset_events', ['asset_id', 'id'], unique=False)
+    op.create_index(
+        'ix_asset_events_created_asset_id', 'asset_events', ['asset_id'], unique=False,
+        postgresql_where=sa.text("event_type = 'created'"),
+    )
+
+    current = datetime.now(timezone.utc).date().replace(day=1)
+    for offset in range(MONTHS_AHEAD + 1):
+        start = _add_months(current, offset)
+        end = _add_months(start, 1)
+        op.execute(
+            f"CREATE TABLE asset_events_p{start:%Y%m} PARTITION OF asset_events "
+            f"FOR VALUES FROM ('{start:%Y-%m-%d} 00:00:00+00') TO ('{end:%Y-%m-%d} 00:00:00+00')"
+        )
+    op.execute("CREATE TABLE asset_events_default PARTITION OF asset_events DEFAULT")
+
+    # Linha de base: o estado atual de cada ativo, registrado no momento da migração
+    # (mudanças anteriores não estão disponíveis para reconstrução)
+    op.execute("""
+        INSERT INTO asset_events (asset_id, event_type, status, assigned_to)
+        SELECT id, 'created', status, assigned_to FROM assets
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Remove o pai e todas as partições anexadas
+    op.execute("DROP TABLE asset_events")
@@ -0,0 +1,40 @@
+"""CreateAssetStats
+
+Revision ID: f7a9c3e5d214
+Revises: e2b4f6a8c013
+Create Date: 2025-11-17 16:08:52.904411
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7a9c3e5d214'
+down_revision: Union[str, Sequence[str], None] = 'e2b4f6a8c013'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Os tipos enum já existem (criados com a tabela assets)
+    op.create_table('asset_stats',
+    sa.Column('status', postgresql.ENUM(name='assetstatus', create_type=False), nullable=False),
+    sa.Column('asset_type', postgresql.ENUM(name='assettype', create_type=False), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('status', 'asset_type')
+    )
+    # Carga inicial; a partir daqui as contagens são mantidas pelas mutações
+    op.execute("""
+        INSERT INTO asset_stats (status, asset_type, count)
+        SELECT status, asset_type, count(*) FROM assets GROUP BY status, asset_type
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('asset_stats')
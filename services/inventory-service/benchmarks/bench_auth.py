@@ -0,0 +1,85 @@
+"""
+Microbenchmark do custo de autenticação por requisição (security.get_current_user).
+
+Compara três variantes sobre o mesmo conjunto de tokens:
+  - antes: decodificação completa a cada chamada, com as linhas de debug em stdout
+  - sem cache: decodificação completa, com logging por nível
+  - com cache: tokens já verificados servidos pelo VerifiedTokenCache
+
+Uso, a partir de services/inventory-service:
+    python -m benchmarks.bench_auth --calls 50000 --users 200
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=100, help="Tokens distintos em rodízio")
+    return parser.parse_args()
+
+
+async def legacy_get_current_user(credentials):
+    # Reprodução do caminho anterior: decodifica sempre e imprime o payload em stdout
+    from fastapi import HTTPException
+    from jose import JWTError, jwt
+    import security
+
+    try:
+        payload = jwt.decode(credentials.credentials, security.SECRET_KEY, algorithms=[security.ALGORITHM])
+        print(f"[DEBUG] Payload decodificado: {payload}")
+        email = payload.get("email")
+        print(f"[DEBUG] Email extraído: {email}")
+        if email is None:
+            raise HTTPException(status_code=401)
+        return security.TokenData(email=email)
+    except JWTError as e:
+        print(f"[DEBUG] Erro ao decodificar JWT: {e}")
+        raise HTTPException(status_code=401)
+
+
+async def measure(fn, credentials, calls: int) -> float:
+    started = time.perf_counter()
+    for i in range(calls):
+        await fn(credentials[i % len(credentials)])
+    return (time.perf_counter() - started) / calls
+
+
+async def run(args) -> None:
+    from fastapi.security import HTTPAuthorizationCredentials
+    from jose import jwt
+    import security
+
+    exp = int(time.time()) + 3600
+    credentials = [
+        HTTPAuthorizationCredentials(
+            scheme="Bearer",
+            credentials=jwt.encode({"email": f"user{i}@assetforge.dev", "sub": str(i), "exp": exp}, security.SECRET_KEY, algorithm=security.ALGORITHM),
+        )
+        for i in range(args.users)
+    ]
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        before = await measure(legacy_get_current_user, credentials, args.calls)
+
+    security.token_cache = security.VerifiedTokenCache(maxsize=0)
+    uncached = await measure(security.get_current_user, credentials, args.calls)
+
+    security.token_cache = security.VerifiedTokenCache()
+    cached = await measure(security.get_current_user, credentials, args.calls)
+
+    for label, per_call in (("antes", before), ("sem cache", uncached), ("com cache", cached)):
+        print(f"{label:>10}: {per_call * 1e6:8.2f} µs/requisição ({1 / per_call:10.0f} req/s)")
+
+
+def main():
+    args = parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark do relay da outbox (eventos publicados por segundo) contra a exchange em memória.
+
+Gera eventos reais pelos caminhos do crud (criação em massa seguida de mudanças de status pelo
+mesmo caminho do PATCH /assets/bulk), drena a outbox com o OutboxRelay e verifica que a ordem
+dos eventos de cada ativo foi preservada.
+
+Uso, a partir de services/inventory-service:
+    python -m benchmarks.bench_outbox --assets 5000 --updates 3 --confirm-delay-ms 1
+    python -m benchmarks.bench_outbox --fail-every 97   # com falhas de publicação injetadas
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.common import configure_database
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--assets", type=int, default=2000)
+    parser.add_argument("--updates", type=int, default=2, help="Mudanças de status por ativo")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--confirm-delay-ms", type=float, default=0.5)
+    parser.add_argument("--fail-every", type=int, default=0)
+    return parser.parse_args()
+
+
+def reset_tables() -> None:
+    from database import engine
+    import models
+
+    # As mutações também gravam histórico e contagens: recria todas as tabelas
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+
+
+async def generate_events(args) -> int:
+    import crud, database, models, schemas
+
+    async with database.AsyncSessionLocal() as db:
+        assets = [
+            (i, schemas.AssetCreate(name=f"Outbox {i}", asset_type=models.AssetType.MONITOR, model="M", serial_number=f"OUT-{i:08d}"))
+            for i in range(args.assets)
+        ]
+        await crud.bulk_create_assets(db, assets)
+        ids = list(range(1, args.assets + 1))
+        statuses = [models.AssetStatus.IN_USE, models.AssetStatus.IN_REPAIR, models.AssetStatus.IN_STOCK]
+        for round_ in range(args.updates):
+            status = statuses[round_ % len(statuses)]
+            await crud.bulk_update_assets(db, [(i, schemas.AssetBulkUpdate(id=asset_id, status=status)) for i, asset_id in enumerate(ids)])
+    return args.assets * (1 + args.updates)
+
+
+async def run(args) -> None:
+    import database, outbox
+    from benchmarks.broker import InMemoryExchange
+
+    total = await generate_events(args)
+    exchange = InMemoryExchange(confirm_delay=args.confirm_delay_ms / 1000, fail_every=args.fail_every)
+    relay = outbox.OutboxRelay(exchange, batch_size=args.batch_size)
+
+    started = time.perf_counter()
+    while relay.published < total:
+        await relay.relay_once()
+    elapsed = time.perf_counter() - started
+    await database.async_engine.dispose()
+
+    last_seen: dict[int, int] = {}
+    out_of_order = 0
+    for _, message in exchange.published:
+        asset_id = json.loads(message.body)["assetId"]
+        event_id = int(message.message_id)
+        if event_id < last_seen.get(asset_id, 0):
+            out_of_order += 1
+        last_seen[asset_id] = event_id
+
+    print(f"Eventos: {total} | publicados: {relay.published} | falhas de publicação: {relay.failed}")
+    print(f"Vazão do relay: {relay.published / elapsed:10.0f} eventos/s ({elapsed:.2f}s)")
+    print(f"Eventos fora de ordem por ativo: {out_of_order}")
+
+
+def main():
+    args = parse_args()
+    args.database_url = configure_database(args.database_url, "bench_outbox")
+    print(f"Banco: {args.database_url}")
+    reset_tables()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Stand-in em memória para o RabbitMQ, usado pelos benchmarks.
+
+Imita a parte da API do aio_pika usada pelo consumidor: `queue.consume(callback)`,
+`queue.cancel(tag)`, `message.ack(multiple=...)`, `message.nack(...)` e o limite de prefetch do `basic_qos`.
+"""
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Deque, Optional
+
+
+class InMemoryMessage:
+    def __init__(
+        self,
+        queue: "InMemoryQueue",
+        body: bytes,
+        delivery_tag: int,
+        message_id: Optional[str] = None,
+        headers: Optional[dict] = None,
+    ):
+        self._queue = queue
+        self.body = body
+        self.delivery_tag = delivery_tag
+        self.message_id = message_id
+        self.headers = headers or {}
+        self.content_type = "application/json"
+        self.timestamp = None
+
+    @asynccontextmanager
+    async def process(self):
+        # Mesma semântica do aio_pika: ack ao sair normalmente, reject em caso de exceção
+        try:
+            yield self
+        except Exception:
+            await self.reject(requeue=False)
+            raise
+        else:
+            await self.ack()
+
+    async def ack(self, multiple: bool = False) -> None:
+        self._queue._settle(self.delivery_tag, multiple, "ack")
+
+    async def nack(self, multiple: bool = False, requeue: bool = True) -> None:
+        self._queue._settle(self.delivery_tag, multiple, "requeue" if requeue else "drop")
+
+    async def reject(self, requeue: bool = False) -> None:
+        self._queue._settle(self.delivery_tag, False, "requeue" if requeue else "drop")
+
+
+class InMemoryQueue:
+    """Fila com entrega limitada por prefetch e contagem de confirmações."""
+
+    def __init__(self, prefetch_count: int = 0):
+        self.prefetch_count = prefetch_count
+        self.acked = 0
+        self.requeued = 0
+        self.dropped = 0
+        # Cada entrega guarda (corpo, message_id, headers)
+        self._ready: Deque[tuple] = deque()
+        self._unacked: dict[int, tuple] = {}
+        # Tempo entre a entrega ao consumidor e o ack de cada mensagem (segundos)
+        self.ack_latencies: list[float] = []
+        self._delivered_at: dict[int, float] = {}
+        self._next_tag = 1
+        self._callback: Optional[Callable[[InMemoryMessage], Awaitable[None]]] = None
+        self._wakeup = asyncio.Event()
+        self._pump_task: Optional[asyncio.Task] = None
+
+    def publish(self, body: bytes, message_id: Optional[str] = None, headers: Optional[dict] = None) -> None:
+        self._ready.append((body, message_id, headers))
+        self._wakeup.set()
+
+    async def consume(self, callback: Callable[[InMemoryMessage], Awaitable[None]]) -> str:
+        self._callback = callback
+        self._pump_task = asyncio.create_task(self._pump())
+        return "in-memory-consumer"
+
+    async def cancel(self, consumer_tag: str) -> None:
+        # Para as entregas; as mensagens já entregues continuam aguardando confirmação
+        await self.close()
+
+    async def wait_until_settled(self, total: int) -> None:
+        while self.acked + self.dropped < total:
+            await asyncio.sleep(0.001)
+
+    async def close(self) -> None:
+        if self._pump_task:
+            self._pump_task.cancel()
+            try:
+                await self._pump_task
+            except asyncio.CancelledError:
+                pass
+
+    def _settle(self, delivery_tag: int, multiple: bool, outcome: str) -> None:
+        # multiple=True liquida todas as entregas pendentes até o delivery tag informado
+        tags = [t for t in self._unacked if t <= delivery_tag] if multiple else [delivery_tag]
+        for tag in tags:
+            delivery = self._unacked.pop(tag, None)
+            delivered_at = self._delivered_at.pop(tag, None)
+            if delivery is None:
+                continue
+            if outcome == "ack":
+                self.acked += 1
+                self.ack_latencies.append(time.perf_counter() - delivered_at)
+            elif outcome == "requeue":
+                self.requeued += 1
+                self._ready.append(delivery)
+            else:
+                self.dropped += 1
+        self._wakeup.set()
+
+    async def _pump(self) -> None:
+        while True:
+            while self._ready and (not self.prefetch_count or len(self._unacked) < self.prefetch_count):
+                delivery = self._ready.popleft()
+                tag = self._next_tag
+                self._next_tag += 1
+                self._unacked[tag] = delivery
+                self._delivered_at[tag] = time.perf_counter()
+                await self._callback(InMemoryMessage(self, delivery[0], tag, *delivery[1:]))
+            self._wakeup.clear()
+            await self._wakeup.wait()
+
+
+class InMemoryExchange:
+    """
+    Exchange que registra as mensagens publicadas. `confirm_delay` simula a latência da
+    confirmação do broker (publisher confirms) e `fail_every` injeta falhas periódicas.
+    """
+
+    def __init__(self, confirm_delay: float = 0.0, fail_every: int = 0):
+        self.confirm_delay = confirm_delay
+        self.fail_every = fail_every
+        self.published: list[tuple[str, object]] = []
+        self._attempts = 0
+
+    async def publish(self, message, routing_key: str) -> None:
+        self._attempts += 1
+        attempt = self._attempts
+        if self.confirm_delay:
+            await asyncio.sleep(self.confirm_delay)
+        if self.fail_every and attempt % self.fail_every == 0:
+            raise ConnectionError("Falha simulada de publicação")
+        self.published.append((routing_key, message))
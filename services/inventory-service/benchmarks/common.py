@@ -0,0 +1,114 @@
+"""
+Utilitários compartilhados pelos benchmarks: escolha do banco e carga de ativos.
+"""
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, Optional
+
+MODELS_BY_TYPE = {
+    "NOTEBOOK": ["Latitude 5440", "ThinkPad T14", "MacBook Pro 14", "EliteBook 840"],
+    "MONITOR": ["P2422H", "ThinkVision T24", "UltraSharp U2723QE"],
+    "KEYBOARD": ["K120", "MX Keys", "KB216"],
+    "MOUSE": ["M90", "MX Master 3S", "MS116"],
+    "HEADSET": ["H390", "Jabra Evolve2 40", "Zone Wired"],
+    "OTHER": ["Docking WD19", "Webcam C920", "Hub USB-C"],
+}
+
+
+# Funcionários distintos entre os quais os ativos em uso são distribuídos
+EMPLOYEES = 500
+
+
+def configure_database(database_url: Optional[str], name: str) -> str:
+    """
+    Define DATABASE_URL antes de importar `database`. Sem URL, usa um SQLite temporário.
+    """
+    if database_url is None:
+        database_url = "sqlite:///" + os.path.join(tempfile.mkdtemp(), f"{name}.db")
+    os.environ["DATABASE_URL"] = database_url
+    return database_url
+
+
+def generate_asset_rows(total: int, seed: int = 42, varied: bool = False) -> Iterator[dict]:
+    """
+    Gera `total` ativos sintéticos. Com `varied`, distribui tipos, status, modelos e datas
+    de criação/atualização ao longo do último ano; os primeiros ativos cobrem todas as
+    combinações de tipo × status e os ativos IN_USE são atribuídos a um funcionário.
+    """
+    import models
+
+    rng = random.Random(seed)
+    types = list(models.AssetType)
+    statuses = list(models.AssetStatus)
+    combinations = [(asset_type, status) for asset_type in types for status in statuses]
+    now = datetime.now(timezone.utc)
+    for i in range(1, total + 1):
+        if not varied:
+            yield {
+                "name": f"Bench asset {i}",
+                "asset_type": models.AssetType.NOTEBOOK,
+                "model": "Bench",
+                "serial_number": f"BENCH-{i:08d}",
+                "status": models.AssetStatus.IN_STOCK,
+            }
+            continue
+        asset_type, status = rng.choice(types), rng.choice(statuses)
+        if i <= len(combinations):
+            asset_type, status = combinations[i - 1]
+        model = rng.choice(MODELS_BY_TYPE[asset_type.value])
+        created_at = now - timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+        yield {
+            "name": f"{asset_type.value.title()} {model} #{i}",
+            "asset_type": asset_type,
+            "model": model,
+            "serial_number": f"BENCH-{i:08d}",
+            "status": status,
+            "assigned_to": (i % EMPLOYEES) + 1 if status == models.AssetStatus.IN_USE else None,
+            "created_at": created_at,
+            "updated_at": created_at + timedelta(minutes=rng.randint(0, 30 * 24 * 60)) if rng.random() < 0.6 else None,
+        }
+
+
+def seed_assets(total: int, varied: bool = False, chunk_size: int = 10000) -> None:
+    """
+    Recria a tabela de ativos e insere `total` ativos com IDs de 1 a `total`.
+    """
+    from sqlalchemy import func, insert, select, text
+    from database import engine
+    import models
+
+    table = models.Asset.__table__
+    with engine.begin() as connection:
+        if engine.dialect.name == "postgresql":
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        table.drop(connection, checkfirst=True)
+        table.create(connection)
+        # Demais tabelas (outbox etc.) escritas pelos caminhos do crud
+        models.Base.metadata.create_all(connection)
+
+    rows = generate_asset_rows(total, varied=varied)
+    while True:
+        chunk = [row for _, row in zip(range(chunk_size), rows)]
+        if not chunk:
+            break
+        with engine.begin() as connection:
+            connection.execute(insert(table), chunk)
+
+    # As contagens de asset_stats partem do estado semeado (a carga não passa pelo crud)
+    stats = models.AssetStat.__table__
+    with engine.begin() as connection:
+        connection.execute(stats.delete())
+        connection.execute(insert(stats).from_select(
+            ["status", "asset_type", "count"],
+            select(table.c.status, table.c.asset_type, func.count()).group_by(table.c.status, table.c.asset_type),
+        ))
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
@@ -0,0 +1,79 @@
+import csv
+import io
+import json
+import os
+
+from fastapi import HTTPException, Request, status
+from pydantic import BaseModel, ValidationError
+
+import schemas
+
+# --- CONFIGURAÇÕES DAS OPERAÇÕES EM MASSA ---
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "50000"))
+# Linhas gravadas por transação; uma falha afeta apenas o próprio lote
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+
+# Documenta no OpenAPI os dois formatos aceitos pelo corpo da requisição
+BULK_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": {"type": "array", "items": {"type": "object"}}},
+            "text/csv": {"schema": {"type": "string"}},
+        },
+    }
+}
+
+
+async def read_rows(request: Request) -> list[dict]:
+    """
+    Lê o corpo da requisição como um array JSON ou como CSV (Content-Type: text/csv, com cabeçalho).
+    """
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("text/csv"):
+        try:
+            reader = csv.DictReader(io.StringIO(body.decode("utf-8-sig")))
+            # Células vazias são tratadas como campos não enviados
+            rows = [{k: v for k, v in row.items() if k is not None and v not in ("", None)} for row in reader]
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid CSV payload: {e}")
+    else:
+        try:
+            rows = json.loads(body)
+        except json.JSONDecodeError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid JSON payload")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Expected a JSON array")
+
+    if len(rows) > BULK_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {BULK_MAX_ROWS} rows per request",
+        )
+    return rows
+
+
+def validate_rows(rows: list, model: type[BaseModel]) -> tuple[list[tuple[int, BaseModel]], list[schemas.BulkRowResult]]:
+    """
+    Valida cada linha isoladamente, separando as válidas (com seu índice) dos resultados de erro.
+    """
+    valid = []
+    invalid = []
+    for index, row in enumerate(rows):
+        try:
+            valid.append((index, model.model_validate(row)))
+        except ValidationError as e:
+            detail = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            serial_number = row.get("serial_number") if isinstance(row, dict) else None
+            invalid.append(schemas.BulkRowResult(
+                index=index, status=schemas.BulkRowStatus.INVALID, serial_number=serial_number, detail=detail,
+            ))
+    return valid, invalid
+
+
+def summarize(results: list[schemas.BulkRowResult]) -> schemas.BulkResult:
+    ok = {schemas.BulkRowStatus.CREATED, schemas.BulkRowStatus.UPDATED, schemas.BulkRowStatus.DELETED}
+    results.sort(key=lambda r: r.index)
+    succeeded = sum(1 for r in results if r.status in ok)
+    return schemas.BulkResult(succeeded=succeeded, failed=len(results) - succeeded, results=results)
@@ -0,0 +1,289 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURAÇÕES DO CACHE ---
+# "memory" (LRU/TTL no próprio processo), "redis" (compartilhado entre processos) ou "none"
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "30"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+# "memory://" usa um stand-in local com a mesma interface do Redis (útil em testes e benchmarks)
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+LIST_GENERATION_KEY = "assets:list:gen"
+# Horário (epoch) da última invalidação feita por qualquer processo, para as leituras em réplicas.
+# Expira bem depois de qualquer atraso de replicação aceito (REPLICA_MAX_LAG_SECONDS)
+LAST_INVALIDATION_KEY = "assets:invalidated_at"
+LAST_INVALIDATION_TTL_SECONDS = 3600
+
+
+class MemoryBackend:
+    """
+    Cache LRU com expiração por entrada, local ao processo.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+    async def incr(self, key: str) -> int:
+        # Contadores não expiram nem são removidos pelo LRU
+        _, value = self._entries.get(key, (0, 0))
+        self._entries[key] = (float("inf"), value + 1)
+        return value + 1
+
+    async def get_counter(self, key: str) -> int:
+        _, value = self._entries.get(key, (0, 0))
+        return value
+
+
+class LocalRedis:
+    """
+    Stand-in em memória para o subconjunto da API do redis.asyncio usado pelo RedisBackend.
+    """
+
+    def __init__(self):
+        self._data: dict[str, tuple[float, Any]] = {}
+
+    async def get(self, key: str):
+        entry = self._data.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            self._data.pop(key, None)
+            return None
+        return entry[1]
+
+    async def set(self, key: str, value, ex: Optional[float] = None):
+        self._data[key] = (time.monotonic() + ex if ex else float("inf"), value)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._data.pop(key, None)
+
+    async def incr(self, key: str) -> int:
+        value = int(await self.get(key) or 0) + 1
+        self._data[key] = (float("inf"), value)
+        return value
+
+
+class RedisBackend:
+    """
+    Cache compartilhado entre processos e réplicas. Os valores são gravados como JSON.
+    """
+
+    def __init__(self, url: str = CACHE_REDIS_URL):
+        if url.startswith("memory://"):
+            self._client = LocalRedis()
+        else:
+            try:
+                import redis.asyncio as redis
+            except ImportError as e:
+                raise RuntimeError("CACHE_BACKEND=redis requer o pacote 'redis'") from e
+            self._client = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self._client.get(key)
+        return None if raw is None else json.loads(raw)
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        await self._client.set(key, json.dumps(value), ex=max(1, int(ttl)))
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self._client.delete(*keys)
+
+    async def incr(self, key: str) -> int:
+        return int(await self._client.incr(key))
+
+    async def get_counter(self, key: str) -> int:
+        return int(await self._client.get(key) or 0)
+
+
+class AssetCache:
+    """
+    Cache de leitura (read-through) para GET /assets/{id} e para as páginas de GET /assets/.
+
+    Ativos individuais são invalidados pela chave; as páginas de listagem carregam na chave uma
+    geração que é incrementada a cada escrita, de modo que qualquer mutação descarta todas as
+    páginas de uma vez sem precisar enumerá-las. Falhas do backend são tratadas como miss.
+
+    A mesma geração, guardada no backend, protege a gravação de ativos lidos do banco: uma
+    escrita de qualquer processo (API ou worker.py) entre a leitura e a gravação a incrementa e
+    o valor, possivelmente anterior à escrita, não fica no cache. Leituras em réplicas também
+    consultam o horário da última invalidação, guardado ao lado da geração (ver `read_token`).
+    """
+
+    def __init__(self, backend, ttl: float = CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = {"asset": 0, "list": 0}
+        self.misses = {"asset": 0, "list": 0}
+        self.invalidations = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    async def _generation(self) -> Optional[int]:
+        try:
+            return await self.backend.get_counter(LIST_GENERATION_KEY)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Falha ao ler a geração do cache: {e}")
+            return None
+
+    async def read_token(self, staleness: float = 0.0) -> Optional[int]:
+        """
+        Geração lida antes de consultar o banco; `set_asset` descarta o valor se ela mudou no meio.
+        `staleness` é o atraso máximo da fonte da leitura (réplica): se houve escrita em qualquer
+        processo dentro dessa janela, a leitura pode não refleti-la e retorna None (não gravar).
+        """
+        if not self.enabled:
+            return None
+        if staleness:
+            try:
+                invalidated_at = await self.backend.get(LAST_INVALIDATION_KEY)
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Falha ao ler a última invalidação do cache: {e}")
+                return None
+            if invalidated_at is not None and time.time() - invalidated_at < staleness:
+                return None
+        return await self._generation()
+
+    async def _get(self, kind: str, key: str) -> Optional[Any]:
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Falha ao ler do cache ({key}): {e}")
+            value = None
+        if value is None:
+            self.misses[kind] += 1
+        else:
+            self.hits[kind] += 1
+        return value
+
+    async def _set(self, key: str, value: Any) -> None:
+        try:
+            await self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Falha ao gravar no cache ({key}): {e}")
+
+    async def get_asset(self, asset_id: int) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        return await self._get("asset", f"assets:{asset_id}")
+
+    async def set_asset(self, asset_id: int, data: dict, token: Optional[int]) -> None:
+        if not self.enabled or token is None or await self._generation() != token:
+            return
+        key = f"assets:{asset_id}"
+        await self._set(key, data)
+        # `invalidate` incrementa a geração antes de remover as chaves: se ela mudou entre a
+        # verificação e a gravação, o valor pode ser anterior à escrita e é removido aqui; se
+        # mudar depois, a remoção feita pela própria invalidação o alcança
+        if await self._generation() != token:
+            try:
+                await self.backend.delete(key)
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Falha ao remover do cache ({key}): {e}")
+
+    async def _list_key(self, params: dict) -> str:
+        generation = await self.backend.get_counter(LIST_GENERATION_KEY)
+        digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+        return f"assets:list:{generation}:{digest}"
+
+    async def get_list(self, params: dict) -> tuple[Optional[dict], Optional[str]]:
+        """
+        Retorna (página em cache, chave para gravação). A chave fixa a geração lida antes da consulta.
+        """
+        if not self.enabled:
+            return None, None
+        try:
+            key = await self._list_key(params)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Falha ao ler a geração das listagens: {e}")
+            return None, None
+        return await self._get("list", key), key
+
+    async def set_list(self, key: Optional[str], data: dict) -> None:
+        if self.enabled and key is not None:
+            await self._set(key, data)
+
+    async def invalidate(self, asset_ids=()) -> None:
+        """
+        Remove os ativos informados e descarta todas as páginas de listagem em cache.
+        """
+        if not self.enabled:
+            return
+        self.invalidations += 1
+        try:
+            # O horário é gravado antes da geração: uma leitura que já vê a geração nova também o vê
+            await self.backend.set(LAST_INVALIDATION_KEY, time.time(), LAST_INVALIDATION_TTL_SECONDS)
+            # A geração sobe antes da remoção (ver `set_asset`)
+            await self.backend.incr(LIST_GENERATION_KEY)
+            await self.backend.delete(*(f"assets:{asset_id}" for asset_id in asset_ids))
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Falha ao invalidar o cache: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "backend": CACHE_BACKEND,
+            "hits": dict(self.hits),
+            "misses": dict(self.misses),
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+        }
+
+
+def shared_between_processes(name: str = CACHE_BACKEND, url: str = CACHE_REDIS_URL) -> bool:
+    """
+    Se uma invalidação feita num processo vale para os outros: só com o Redis de verdade (ou sem
+    cache). Com o cache em memória, escritas do worker.py não limpam o cache da API.
+    """
+    return name == "none" or (name == "redis" and not url.startswith("memory://"))
+
+
+def create_backend(name: str = CACHE_BACKEND):
+    if name == "none":
+        return None
+    if name == "redis":
+        return RedisBackend(CACHE_REDIS_URL)
+    if name == "memory":
+        return MemoryBackend(CACHE_MAX_ENTRIES)
+    raise ValueError(f"CACHE_BACKEND inválido: {name}")
+
+
+asset_cache = AssetCache(create_backend())
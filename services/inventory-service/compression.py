@@ -0,0 +1,87 @@
+"""
+Compressão das respostas HTTP negociada por Accept-Encoding: brotli (se o pacote `brotli`
+estiver instalado), senão gzip. Respostas menores que COMPRESSION_MIN_SIZE seguem sem compressão.
+Respostas em streaming (exportação) são comprimidas bloco a bloco.
+"""
+import logging
+import os
+
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipResponder, IdentityResponder
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURAÇÕES DA COMPRESSÃO ---
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() in ("1", "true", "yes")
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024")) # Bytes
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+# Qualidade 4 comprime melhor que o gzip 6 com custo de CPU semelhante
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def accepts_encoding(accept_encoding: str, coding: str) -> bool:
+    """
+    Verifica se o cliente aceita `coding`, respeitando q=0 (ex.: "br;q=0").
+    """
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        if name.strip().lower() not in (coding, "*"):
+            continue
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app, minimum_size: int, quality: int = COMPRESSION_BROTLI_QUALITY):
+        super().__init__(app, minimum_size)
+        self.quality = quality
+        self._compressor = None
+
+    async def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if self._compressor is None:
+            self._compressor = brotli.Compressor(quality=self.quality)
+        data = self._compressor.process(body)
+        return data + (self._compressor.flush() if more_body else self._compressor.finish())
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app,
+        minimum_size: int = COMPRESSION_MIN_SIZE,
+        gzip_level: int = COMPRESSION_GZIP_LEVEL,
+        brotli_quality: int = COMPRESSION_BROTLI_QUALITY,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        if brotli is None:
+            logger.info("Pacote 'brotli' não instalado; respostas serão comprimidas apenas com gzip.")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        if brotli is not None and accepts_encoding(accept_encoding, "br"):
+            responder = BrotliResponder(self.app, self.minimum_size, self.brotli_quality)
+        elif accepts_encoding(accept_encoding, "gzip"):
+            responder = GZipResponder(self.app, self.minimum_size, compresslevel=self.gzip_level)
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size)
+        await responder(scope, receive, send)
@@ -1,50 +1,709 @@
-from sqlalchemy.orm import Session
-import models, schemas
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from pydantic import BaseModel
+from sqlalchemy import bindparam, case, delete, func, insert, literal, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+import models, outbox, schemas
+from cache import asset_cache
+
+logger = logging.getLogger(__name__)
 
 # Função para LER um único ativo por ID
-def get_asset(db: Session, asset_id: int):
-    return db.query(models.Asset).filter(models.Asset.id == asset_id).first()
+async def get_asset(db: AsyncSession, asset_id: int):
+    result = await db.execute(select(models.Asset).where(models.Asset.id == asset_id))
+    return result.scalars().first()
+
+# Função para LER apenas a versão e as datas de um ativo (requisições condicionais sem buscar a linha inteira)
+async def get_asset_version(db: AsyncSession, asset_id: int):
+    result = await db.execute(
+        select(models.Asset.version, models.Asset.created_at, models.Asset.updated_at).where(models.Asset.id == asset_id)
+    )
+    return result.first()
+
+# Função para LER um ativo pelo número de série
+async def get_asset_by_serial_number(db: AsyncSession, serial_number: str):
+    result = await db.execute(select(models.Asset).where(models.Asset.serial_number == serial_number))
+    return result.scalars().first()
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+# Aplica os filtros de listagem; cada combinação é coberta por um índice (ver models.Asset)
+def apply_asset_filters(query, filters: schemas.AssetFilter | None):
+    if filters is None:
+        return query
+    if filters.status is not None:
+        query = query.where(models.Asset.status == filters.status)
+    if filters.asset_type is not None:
+        query = query.where(models.Asset.asset_type == filters.asset_type)
+    if filters.assigned_to is not None:
+        query = query.where(models.Asset.assigned_to == filters.assigned_to)
+    if filters.created_from is not None:
+        query = query.where(models.Asset.created_at >= filters.created_from)
+    if filters.created_to is not None:
+        query = query.where(models.Asset.created_at < filters.created_to)
+    if filters.updated_from is not None:
+        query = query.where(models.Asset.updated_at >= filters.updated_from)
+    if filters.updated_to is not None:
+        query = query.where(models.Asset.updated_at < filters.updated_to)
+    if filters.q:
+        pattern = f"%{_escape_like(filters.q)}%"
+        query = query.where(or_(
+            models.Asset.name.ilike(pattern, escape="\\"),
+            models.Asset.model.ilike(pattern, escape="\\"),
+        ))
+    return query
+
+# Função para LER uma página de ativos (paginação por keyset, ordenada por id)
+async def get_assets(
+    db: AsyncSession,
+    limit: int = 100,
+    after_id: int | None = None,
+    filters: schemas.AssetFilter | None = None,
+):
+    query = apply_asset_filters(select(models.Asset), filters).order_by(models.Asset.id).limit(limit)
+    if after_id is not None:
+        query = query.where(models.Asset.id > after_id)
+    result = await db.execute(query)
+    return result.scalars().all()
+
+# Colunas de schemas.Asset, na mesma ordem, para as leituras que dispensam objetos ORM
+ASSET_COLUMNS = [getattr(models.Asset, name) for name in schemas.Asset.model_fields]
+# Só o que entra no ETag e no Last-Modified de uma página (ver main.page_validators)
+PAGE_VALIDATOR_COLUMNS = [models.Asset.id, models.Asset.version, models.Asset.created_at, models.Asset.updated_at]
+
+# Função para LER uma página de ativos como dicts (listagem serializada por schemas.asset_row_page_adapter)
+async def get_asset_rows(
+    db: AsyncSession,
+    limit: int = 100,
+    after_id: int | None = None,
+    filters: schemas.AssetFilter | None = None,
+    columns=ASSET_COLUMNS,
+) -> list[dict]:
+    query = apply_asset_filters(select(*columns), filters).order_by(models.Asset.id).limit(limit)
+    if after_id is not None:
+        query = query.where(models.Asset.id > after_id)
+    result = await db.execute(query)
+    # dict(zip()) custa bem menos que Row._asdict() por linha
+    keys = tuple(result.keys())
+    return [dict(zip(keys, row)) for row in result]
+
+# Função para PERCORRER todos os ativos com um cursor do lado do servidor, em lotes de dicts
+async def stream_asset_rows(db: AsyncSession, batch_size: int = 1000, filters: schemas.AssetFilter | None = None):
+    query = (
+        apply_asset_filters(select(*ASSET_COLUMNS), filters)
+        .order_by(models.Asset.id)
+        .execution_options(yield_per=batch_size)
+    )
+    result = await db.stream(query)
+    keys = tuple(result.keys())
+    async for partition in result.partitions():
+        yield [dict(zip(keys, row)) for row in partition]
+
+# Grava eventos na tabela de outbox dentro da transação corrente (publicados depois pelo relay)
+async def _add_outbox_events(db: AsyncSession, events: list[dict]):
+    if events:
+        await db.execute(insert(models.OutboxEvent), events)
+
+# Grava no histórico o estado atual dos ativos informados (INSERT ... SELECT na transação corrente).
+# Alterações feitas via ORM precisam de flush antes, para que o SELECT as enxergue.
+async def _add_history_events(db: AsyncSession, event_type: schemas.AssetEventType, asset_ids):
+    asset_ids = list(asset_ids)
+    if asset_ids:
+        await db.execute(insert(models.AssetEvent).from_select(
+            ["asset_id", "event_type", "status", "assigned_to"],
+            select(models.Asset.id, literal(event_type.value), models.Asset.status, models.Asset.assigned_to)
+            .where(models.Asset.id.in_(asset_ids)),
+        ))
 
-# Função para LER uma lista de ativos
-def get_assets(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Asset).offset(skip).limit(limit).all()
+# Grava eventos que levam os campos gravados: a linha inteira na criação, só os campos cujo valor
+# mudou nos updates. `rows` traz (id, status, assigned_to, changes) já no estado final
+async def _add_change_events(db: AsyncSession, event_type: schemas.AssetEventType, rows):
+    events = [
+        {"asset_id": asset_id, "event_type": event_type.value, "status": status, "assigned_to": assigned_to, "changes": changes}
+        for asset_id, status, assigned_to, changes in rows
+    ]
+    if events:
+        await db.execute(insert(models.AssetEvent), events)
+
+# Colunas que o PUT e o PATCH /assets/bulk podem alterar
+EDITABLE_FIELDS = tuple(schemas.AssetCreate.model_fields)
+
+# Lê os valores editáveis dos ativos informados ({id: {campo: valor}}); com lock=True trava as linhas
+async def _editable_values(db: AsyncSession, asset_ids, lock: bool = False) -> dict[int, dict]:
+    asset_ids = list(asset_ids)
+    if not asset_ids:
+        return {}
+    query = select(models.Asset.id, *(getattr(models.Asset, name) for name in EDITABLE_FIELDS)).where(models.Asset.id.in_(asset_ids))
+    if lock:
+        query = query.with_for_update()
+    return {row.id: {name: getattr(row, name) for name in EDITABLE_FIELDS} for row in (await db.execute(query)).all()}
+
+# Campos enviados em `update` cujo valor difere de `previous` (valores antes da escrita), em JSON
+def _changed_fields(update: BaseModel, previous: dict, exclude=()) -> dict:
+    sent = update.model_dump(exclude_unset=True, exclude_none=True, exclude=set(exclude))
+    return update.model_dump(mode="json", include={name for name, value in sent.items() if previous[name] != value})
+
+# Lê (status, asset_type) dos ativos informados; com lock=True trava as linhas até o fim da
+# transação, para que o "antes" usado nas contagens não mude até o commit
+async def _status_and_type(db: AsyncSession, asset_ids, lock: bool = False) -> dict[int, tuple]:
+    asset_ids = list(asset_ids)
+    if not asset_ids:
+        return {}
+    query = select(models.Asset.id, models.Asset.status, models.Asset.asset_type).where(models.Asset.id.in_(asset_ids))
+    if lock:
+        query = query.with_for_update()
+    return {asset_id: (status, asset_type) for asset_id, status, asset_type in (await db.execute(query)).all()}
+
+# Aplica em asset_stats a diferença entre os pares (status, asset_type) antes e depois da mutação.
+# Deve ser o último comando antes do commit: as linhas de asset_stats ficam travadas até ele,
+# e a ordem fixa das chaves evita deadlocks entre transações concorrentes.
+async def _apply_stats_delta(db: AsyncSession, before=(), after=()):
+    delta = Counter()
+    for key in before:
+        delta[key] -= 1
+    for key in after:
+        delta[key] += 1
+    await _upsert_stats_delta(db, delta)
+
+# Soma `delta` ({(status, asset_type): diferença}) às contagens de asset_stats
+async def _upsert_stats_delta(db: AsyncSession, delta: Counter):
+    rows = [
+        {"status": status, "asset_type": asset_type, "count": count}
+        for (status, asset_type), count in sorted(delta.items()) if count
+    ]
+    if not rows:
+        return
+    stmt = _upsert_insert(db)(models.AssetStat).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.AssetStat.status, models.AssetStat.asset_type],
+        set_={"count": models.AssetStat.count + stmt.excluded["count"]},
+    )
+    await db.execute(stmt)
 
 # Função para CRIAR um novo ativo
-def create_asset(db: Session, asset: schemas.AssetCreate):
+async def create_asset(db: AsyncSession, asset: schemas.AssetCreate):
     db_asset = models.Asset(**asset.model_dump())
     db.add(db_asset)
-    db.commit()
-    db.refresh(db_asset)
+    await db.flush() # Gera o ID para o evento, ainda na mesma transação
+    values = asset.model_dump(mode="json")
+    await _add_outbox_events(db, [outbox.asset_created(db_asset.id, values)])
+    await _add_change_events(db, schemas.AssetEventType.CREATED, [(db_asset.id, db_asset.status, db_asset.assigned_to, values)])
+    await _apply_stats_delta(db, after=[(db_asset.status, db_asset.asset_type)])
+    await db.commit()
+    await asset_cache.invalidate()
+    await db.refresh(db_asset)
     return db_asset
 
-# Função para ATUALIZAR um ativo 
-def update_asset(db: Session, asset_id: int, asset_update: schemas.AssetCreate):
-    db_asset = get_asset(db, asset_id)
-    if db_asset:
-        # Pega os dados do Pydantic e converte para um dicionário
-        update_data = asset_update.model_dump(exclude_unset=True)
-        # Itera sobre os dados para atualizar o objeto do banco
-        for key, value in update_data.items():
-            setattr(db_asset, key, value)
-        db.commit()
-        db.refresh(db_asset)
+class StaleVersionError(Exception):
+    # A versão esperada (If-Match) não é a versão atual do ativo
+    def __init__(self, current_version: int | None = None):
+        super().__init__("Asset was modified")
+        self.current_version = current_version
+
+# Trava a linha a ser alterada e confere a versão esperada. Retorna (status, asset_type, version),
+# usado nos deltas de asset_stats e no histórico, ou None se o ativo não existe.
+async def _lock_for_write(db: AsyncSession, asset_id: int, expected_versions: set[int] | None = None):
+    current = (await db.execute(
+        select(models.Asset.status, models.Asset.asset_type, models.Asset.version)
+        .where(models.Asset.id == asset_id)
+        .with_for_update()
+    )).first()
+    if current is not None and expected_versions is not None and current.version not in expected_versions:
+        await db.rollback()
+        raise StaleVersionError(current.version)
+    return current
+
+# UPDATE ... RETURNING condicionado à versão esperada; incrementa a versão. Retorna o ativo
+# atualizado e os valores editáveis anteriores ({campo: valor}), ou None se nenhuma linha foi alterada.
+async def _update_versioned(db: AsyncSession, asset_id: int, values: dict, expected_versions: set[int] | None = None):
+    stmt = (
+        update(models.Asset)
+        .values(**values, version=models.Asset.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if expected_versions is not None:
+        stmt = stmt.where(models.Asset.version.in_(expected_versions))
+    if db.bind.dialect.name == "postgresql":
+        # Um único comando: a CTE trava a linha e lê o estado anterior, devolvido pelo RETURNING
+        previous = (
+            select(models.Asset.id, *(getattr(models.Asset, name) for name in EDITABLE_FIELDS))
+            .where(models.Asset.id == asset_id)
+            .with_for_update()
+            .cte("previous")
+        )
+        stmt = stmt.where(models.Asset.id == previous.c.id).returning(
+            models.Asset, *(previous.c[name].label(f"previous_{name}") for name in EDITABLE_FIELDS)
+        )
+        row = (await db.execute(stmt)).first()
+        return None if row is None else (row[0], dict(zip(EDITABLE_FIELDS, row[1:])))
+    # O RETURNING do SQLite não enxerga as tabelas do FROM: lê o estado anterior antes (o SQLite
+    # tem um único escritor, então ele não muda entre os dois comandos)
+    before = await _editable_values(db, [asset_id])
+    if asset_id not in before:
+        return None
+    db_asset = (await db.scalars(stmt.where(models.Asset.id == asset_id).returning(models.Asset))).first()
+    return None if db_asset is None else (db_asset, before[asset_id])
+
+# Função para ATUALIZAR um ativo, com um único UPDATE ... RETURNING condicionado à versão (If-Match).
+# Lança StaleVersionError se `expected_versions` não contém a versão atual; retorna None se o ativo não existe.
+async def update_asset(
+    db: AsyncSession, asset_id: int, asset_update: schemas.AssetCreate, expected_versions: set[int] | None = None,
+):
+    update_data = asset_update.model_dump(exclude_unset=True)
+    updated = await _update_versioned(db, asset_id, update_data, expected_versions)
+    if updated is None:
+        # Falha: só aqui se consulta de novo, para diferenciar ativo inexistente (404) de versão velha (412)
+        current = await get_asset_version(db, asset_id)
+        await db.rollback()
+        if current is None:
+            return None
+        raise StaleVersionError(current.version)
+    db_asset, previous = updated
+    await _add_outbox_events(db, [outbox.asset_updated(asset_id, asset_update.model_dump(mode="json", exclude_unset=True))])
+    await _add_change_events(db, schemas.AssetEventType.UPDATED, [
+        (asset_id, db_asset.status, db_asset.assigned_to, _changed_fields(asset_update, previous))
+    ])
+    await _apply_stats_delta(db, [(previous["status"], previous["asset_type"])], [(db_asset.status, db_asset.asset_type)])
+    await db.commit()
+    await asset_cache.invalidate([asset_id])
     return db_asset
 
-def update_asset_status_and_assignee(db: Session, asset_id: int, new_status: str, assigned_to_id: int):    
-    # Atualiza o status e o ID do funcionário atribuído a um ativo.
-    # Retorna o ativo atualizado ou None se não encontrado.    
-    db_asset = db.query(models.Asset).filter(models.Asset.id == asset_id).first()
-    if db_asset:
-        db_asset.status = new_status
-        db_asset.assigned_to = assigned_to_id
-        db.commit()
-        db.refresh(db_asset)
+@dataclass
+class CheckoutResult:
+    applied: set[str] = field(default_factory=set) # IDs de mensagem aplicados nesta chamada
+    duplicates: set[str] = field(default_factory=set) # Já registrados no ledger (reentregas)
+    missing: set[str] = field(default_factory=set) # Ativo inexistente; não ficam no ledger
+
+async def apply_checkouts(db: AsyncSession, checkouts: list[tuple[str, int, int]]) -> CheckoutResult:
+    # Aplica checkouts (message_id, asset_id, employee_id) de forma idempotente, em uma transação:
+    # registra as mensagens no ledger (INSERT ... ON CONFLICT DO NOTHING RETURNING), descarta as já
+    # processadas e atualiza os ativos restantes com um único UPDATE ... WHERE id IN (...).
+    result = CheckoutResult()
+    if not checkouts:
+        return result
+
+    message_ids = list(dict.fromkeys(message_id for message_id, _, _ in checkouts))
+    ledger = (
+        _upsert_insert(db)(models.ProcessedEvent)
+        .values([{"message_id": message_id} for message_id in message_ids])
+        .on_conflict_do_nothing(index_elements=[models.ProcessedEvent.message_id])
+        .returning(models.ProcessedEvent.message_id)
+    )
+    new_ids = set((await db.execute(ledger)).scalars())
+    result.duplicates = set(message_ids) - new_ids
+
+    assignments: dict[int, int] = {}
+    for message_id, asset_id, employee_id in checkouts:
+        if message_id in new_ids:
+            # Mensagens posteriores para o mesmo ativo prevalecem (ordem de entrega da fila)
+            assignments[asset_id] = employee_id
+
+    updated_ids = set()
+    if assignments:
+        before = await _status_and_type(db, assignments, lock=True)
+        stmt = (
+            update(models.Asset)
+            .where(models.Asset.id.in_(assignments))
+            .values(
+                status=models.AssetStatus.IN_USE,
+                assigned_to=case(assignments, value=models.Asset.id),
+                version=models.Asset.version + 1,
+            )
+            .returning(models.Asset.id)
+            .execution_options(synchronize_session=False)
+        )
+        updated_ids = set((await db.execute(stmt)).scalars())
+        await _add_outbox_events(db, [
+            outbox.asset_status_changed(asset_id, models.AssetStatus.IN_USE, assignments[asset_id])
+            for asset_id in updated_ids
+        ])
+        await _add_history_events(db, schemas.AssetEventType.STATUS_CHANGED, updated_ids)
+        await _apply_stats_delta(
+            db,
+            [before[asset_id] for asset_id in updated_ids],
+            [(models.AssetStatus.IN_USE, before[asset_id][1]) for asset_id in updated_ids],
+        )
+
+    for message_id, asset_id, _ in checkouts:
+        if message_id in new_ids:
+            (result.applied if asset_id in updated_ids else result.missing).add(message_id)
+    if result.missing:
+        # Permite reprocessar a mensagem (ex.: reenvio manual da DLQ) depois que o ativo existir
+        await db.execute(delete(models.ProcessedEvent).where(models.ProcessedEvent.message_id.in_(result.missing)))
+
+    await db.commit()
+    if updated_ids:
+        await asset_cache.invalidate(updated_ids)
+    return result
+
+async def prune_processed_events(db: AsyncSession, older_than: datetime) -> int:
+    # Remove do ledger as mensagens antigas o bastante para não serem mais reentregues
+    result = await db.execute(delete(models.ProcessedEvent).where(models.ProcessedEvent.processed_at < older_than))
+    await db.commit()
+    return result.rowcount
+
+# Função para LER o histórico de um ativo, do evento mais recente para o mais antigo
+async def get_asset_history(
+    db: AsyncSession,
+    asset_id: int,
+    limit: int = 100,
+    before_id: int | None = None,
+    changed_from: datetime | None = None,
+    changed_to: datetime | None = None,
+):
+    query = (
+        select(models.AssetEvent)
+        .where(models.AssetEvent.asset_id == asset_id)
+        .order_by(models.AssetEvent.id.desc())
+        .limit(limit)
+    )
+    if before_id is not None:
+        query = query.where(models.AssetEvent.id < before_id)
+    if changed_from is not None:
+        query = query.where(models.AssetEvent.changed_at >= changed_from)
+    if changed_to is not None:
+        query = query.where(models.AssetEvent.changed_at < changed_to)
+    result = await db.execute(query)
+    return result.scalars().all()
+
+# Função para LER o estado dos ativos em um instante passado (paginação por keyset, ordenada por asset_id)
+async def get_assets_as_of(
+    db: AsyncSession,
+    ts: datetime,
+    limit: int = 100,
+    after_id: int | None = None,
+    status: models.AssetStatus | None = None,
+    assigned_to: int | None = None,
+):
+    # Percorre os eventos de criação em ordem de ativo e, para cada um, busca pelo índice
+    # (asset_id, id) o último evento até `ts`; ativos removidos até `ts` ficam de fora.
+    created = aliased(models.AssetEvent)
+    latest = aliased(models.AssetEvent)
+    latest_id = (
+        select(func.max(models.AssetEvent.id))
+        .where(models.AssetEvent.asset_id == created.asset_id, models.AssetEvent.changed_at <= ts)
+        .correlate(created)
+        .scalar_subquery()
+    )
+    query = (
+        select(latest)
+        .select_from(created)
+        .join(latest, latest.id == latest_id)
+        .where(
+            created.event_type == schemas.AssetEventType.CREATED.value,
+            created.changed_at <= ts,
+            latest.changed_at <= ts, # Permite ao PostgreSQL descartar as partições posteriores a ts
+            latest.event_type != schemas.AssetEventType.DELETED.value,
+        )
+        .order_by(created.asset_id)
+        .limit(limit)
+    )
+    if after_id is not None:
+        query = query.where(created.asset_id > after_id)
+    if status is not None:
+        query = query.where(latest.status == status)
+    if assigned_to is not None:
+        query = query.where(latest.assigned_to == assigned_to)
+    result = await db.execute(query)
+    return result.scalars().all()
+
+# Função para LER as contagens por status × tipo: da tabela de resumo ou, para um único
+# funcionário, pelo índice (assigned_to, id), sem percorrer a tabela inteira
+async def get_asset_stats(db: AsyncSession, assigned_to: int | None = None):
+    if assigned_to is None:
+        query = (
+            select(models.AssetStat.status, models.AssetStat.asset_type, models.AssetStat.count)
+            .where(models.AssetStat.count > 0)
+        )
+    else:
+        query = (
+            select(models.Asset.status, models.Asset.asset_type, func.count())
+            .where(models.Asset.assigned_to == assigned_to)
+            .group_by(models.Asset.status, models.Asset.asset_type)
+        )
+    result = await db.execute(query)
+    return result.all()
+
+async def reconcile_asset_stats(db: AsyncSession) -> dict[tuple, tuple[int, int]]:
+    # Recalcula as contagens a partir de 'assets' e corrige as divergências de asset_stats.
+    # Retorna {(status, asset_type): (valor gravado, valor real)} das combinações corrigidas.
+    if db.bind.dialect.name == "postgresql":
+        # As duas leituras vêm do mesmo snapshot, sem travar nada: cada mutação altera 'assets'
+        # e asset_stats na mesma transação, então a diferença entre elas é só a divergência
+        await db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    actual = {
+        (status, asset_type): count
+        for status, asset_type, count in (await db.execute(
+            select(models.Asset.status, models.Asset.asset_type, func.count())
+            .group_by(models.Asset.status, models.Asset.asset_type)
+        )).all()
+    }
+    stored = {
+        (status, asset_type): count
+        for status, asset_type, count in (await db.execute(
+            select(models.AssetStat.status, models.AssetStat.asset_type, models.AssetStat.count)
+        )).all()
+    }
+    await db.rollback() # Encerra o snapshot antes de escrever
+    drift = {
+        key: (stored.get(key, 0), actual.get(key, 0))
+        for key in sorted(stored.keys() | actual.keys())
+        if stored.get(key, 0) != actual.get(key, 0)
+    }
+    if drift:
+        # Corrige com deltas, como as mutações: o que foi confirmado depois do snapshot já
+        # aplicou o próprio delta e continua valendo; o lock das linhas dura só este comando
+        await _upsert_stats_delta(db, Counter({key: count - stored_count for key, (stored_count, count) in drift.items()}))
+        await db.commit()
+    return drift
+
+# Função para DELETAR um ativo, com DELETE ... RETURNING.
+# Lança StaleVersionError se `expected_versions` (If-Match) não contém a versão atual.
+async def delete_asset(db: AsyncSession, asset_id: int, expected_versions: set[int] | None = None):
+    current = await _lock_for_write(db, asset_id, expected_versions)
+    if current is None:
+        return None
+    # O último estado do ativo fica registrado no evento de remoção
+    await _add_history_events(db, schemas.AssetEventType.DELETED, [asset_id])
+    stmt = (
+        delete(models.Asset)
+        .where(models.Asset.id == asset_id)
+        .returning(models.Asset)
+        .execution_options(synchronize_session=False)
+    )
+    db_asset = (await db.scalars(stmt)).first()
+    await _add_outbox_events(db, [outbox.asset_deleted(asset_id)])
+    await _apply_stats_delta(db, before=[(current.status, current.asset_type)])
+    await db.commit()
+    await asset_cache.invalidate([asset_id])
     return db_asset
 
-# Função para DELETAR um ativo
-def delete_asset(db: Session, asset_id: int):
-    db_asset = get_asset(db, asset_id)
-    if db_asset:
-        db.delete(db_asset)
-        db.commit()
-    return db_asset
\ No newline at end of file
+# --- OPERAÇÕES EM MASSA ---
+
+def _upsert_insert(db: AsyncSession):
+    # INSERT com suporte a ON CONFLICT no dialeto em uso
+    dialect = db.bind.dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert
+    if dialect == "sqlite":
+        return sqlite.insert
+    raise NotImplementedError(f"Bulk insert não suportado para o dialeto {dialect}")
+
+def _chunks(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _row_error(index: int, detail: str, **kwargs) -> schemas.BulkRowResult:
+    return schemas.BulkRowResult(index=index, status=schemas.BulkRowStatus.ERROR, detail=detail, **kwargs)
+
+async def bulk_create_assets(
+    db: AsyncSession, assets: list[tuple[int, schemas.AssetCreate]], chunk_size: int = 1000,
+) -> list[schemas.BulkRowResult]:
+    # Insere os ativos em lotes com INSERT ... ON CONFLICT (serial_number) DO NOTHING RETURNING:
+    # a verificação de duplicados e a inserção são o mesmo comando, um por lote e transação.
+    results = []
+    rows = []
+    seen = set()
+    for index, asset in assets:
+        if asset.serial_number in seen:
+            results.append(schemas.BulkRowResult(
+                index=index, status=schemas.BulkRowStatus.DUPLICATE,
+                serial_number=asset.serial_number, detail="Serial number repeated in payload",
+            ))
+            continue
+        seen.add(asset.serial_number)
+        rows.append((index, asset))
+
+    insert_stmt = _upsert_insert(db)
+    for chunk in _chunks(rows, chunk_size):
+        stmt = (
+            insert_stmt(models.Asset)
+            .values([asset.model_dump() for _, asset in chunk])
+            .on_conflict_do_nothing(index_elements=[models.Asset.serial_number])
+            .returning(models.Asset.id, models.Asset.serial_number)
+        )
+        try:
+            created = {serial_number: asset_id for asset_id, serial_number in (await db.execute(stmt)).all()}
+            inserted = [
+                (created[asset.serial_number], asset, asset.model_dump(mode="json"))
+                for _, asset in chunk if asset.serial_number in created
+            ]
+            await _add_outbox_events(db, [outbox.asset_created(asset_id, values) for asset_id, _, values in inserted])
+            await _add_change_events(db, schemas.AssetEventType.CREATED, [
+                (asset_id, asset.status, None, values) for asset_id, asset, values in inserted
+            ])
+            await _apply_stats_delta(db, after=[
+                (asset.status, asset.asset_type) for _, asset in chunk if asset.serial_number in created
+            ])
+            await db.commit()
+            if created:
+                await asset_cache.invalidate()
+        except SQLAlchemyError as e:
+            await db.rollback()
+            logger.error(f"Falha ao inserir lote de {len(chunk)} ativos: {e}")
+            results.extend(_row_error(index, "Database error", serial_number=a.serial_number) for index, a in chunk)
+            continue
+        for index, asset in chunk:
+            asset_id = created.get(asset.serial_number)
+            if asset_id is None:
+                results.append(schemas.BulkRowResult(
+                    index=index, status=schemas.BulkRowStatus.DUPLICATE,
+                    serial_number=asset.serial_number, detail="Serial number already registered",
+                ))
+            else:
+                results.append(schemas.BulkRowResult(
+                    index=index, status=schemas.BulkRowStatus.CREATED, id=asset_id, serial_number=asset.serial_number,
+                ))
+    return results
+
+async def bulk_update_assets(
+    db: AsyncSession, updates: list[tuple[int, schemas.AssetBulkUpdate]], chunk_size: int = 1000,
+) -> list[schemas.BulkRowResult]:
+    # Atualiza parcialmente vários ativos. Por lote: uma consulta para os IDs existentes, uma para
+    # conflitos de serial_number e um executemany por combinação de campos alterados.
+    results = []
+    rows = []
+    seen_ids = set()
+    for index, item in updates:
+        if item.id in seen_ids:
+            results.append(schemas.BulkRowResult(
+                index=index, status=schemas.BulkRowStatus.DUPLICATE, id=item.id, detail="Asset id repeated in payload",
+            ))
+            continue
+        seen_ids.add(item.id)
+        rows.append((index, item))
+
+    table = models.Asset.__table__
+    for chunk in _chunks(rows, chunk_size):
+        ids = [item.id for _, item in chunk]
+        serials = [item.serial_number for _, item in chunk if item.serial_number is not None]
+        try:
+            # Trava as linhas existentes: o estado anterior alimenta o delta de asset_stats e o histórico
+            before = await _editable_values(db, ids, lock=True)
+            existing = set(before)
+            owners = {}
+            if serials:
+                owners = dict((await db.execute(
+                    select(models.Asset.serial_number, models.Asset.id).where(models.Asset.serial_number.in_(serials))
+                )).all())
+
+            groups: dict[tuple, list[dict]] = {}
+            applied = []
+            claimed = {}
+            for index, item in chunk:
+                if item.id not in existing:
+                    results.append(schemas.BulkRowResult(index=index, status=schemas.BulkRowStatus.NOT_FOUND, id=item.id))
+                    continue
+                values = item.model_dump(exclude_unset=True, exclude_none=True, exclude={"id"})
+                serial_number = values.get("serial_number")
+                if serial_number is not None:
+                    owner = claimed.get(serial_number, owners.get(serial_number))
+                    if owner is not None and owner != item.id:
+                        results.append(schemas.BulkRowResult(
+                            index=index, status=schemas.BulkRowStatus.DUPLICATE, id=item.id,
+                            serial_number=serial_number, detail="Serial number already registered",
+                        ))
+                        continue
+                    claimed[serial_number] = item.id
+                applied.append((index, item))
+                if values:
+                    groups.setdefault(tuple(sorted(values)), []).append(
+                        {"b_id": item.id, **{f"b_{key}": value for key, value in values.items()}}
+                    )
+
+            for columns, params in groups.items():
+                stmt = (
+                    update(table)
+                    .where(table.c.id == bindparam("b_id"))
+                    .values({**{column: bindparam(f"b_{column}") for column in columns}, "version": table.c.version + 1})
+                )
+                await db.execute(stmt, params)
+            sent = {
+                item.id: item.model_dump(mode="json", exclude_unset=True, exclude_none=True, exclude={"id"})
+                for _, item in applied
+            }
+            await _add_outbox_events(db, [outbox.asset_updated(asset_id, values) for asset_id, values in sent.items()])
+            # Estado já atualizado das linhas alteradas: vai para o histórico e para as contagens
+            current = {
+                asset_id: (status, asset_type, assigned_to)
+                for asset_id, status, asset_type, assigned_to in (await db.execute(
+                    select(models.Asset.id, models.Asset.status, models.Asset.asset_type, models.Asset.assigned_to)
+                    .where(models.Asset.id.in_([asset_id for asset_id, values in sent.items() if values]))
+                )).all()
+            }
+            items = {item.id: item for _, item in applied}
+            await _add_change_events(db, schemas.AssetEventType.UPDATED, [
+                (asset_id, status, assigned_to, _changed_fields(items[asset_id], before[asset_id], exclude={"id"}))
+                for asset_id, (status, _, assigned_to) in current.items()
+            ])
+            recounted = [item.id for _, item in applied if item.status is not None or item.asset_type is not None]
+            await _apply_stats_delta(
+                db,
+                [(before[asset_id]["status"], before[asset_id]["asset_type"]) for asset_id in recounted],
+                [current[asset_id][:2] for asset_id in recounted],
+            )
+            await db.commit()
+            await asset_cache.invalidate([item.id for _, item in applied])
+        except SQLAlchemyError as e:
+            await db.rollback()
+            logger.error(f"Falha ao atualizar lote de {len(chunk)} ativos: {e}")
+            handled = {r.index for r in results}
+            results.extend(_row_error(index, "Database error", id=item.id) for index, item in chunk if index not in handled)
+            continue
+        results.extend(
+            schemas.BulkRowResult(index=index, status=schemas.BulkRowStatus.UPDATED, id=item.id, serial_number=item.serial_number)
+            for index, item in applied
+        )
+    return results
+
+async def bulk_delete_assets(db: AsyncSession, asset_ids: list[int], chunk_size: int = 1000) -> list[schemas.BulkRowResult]:
+    # Remove os ativos com um DELETE ... WHERE id IN (...) RETURNING id por lote.
+    results = []
+    rows = []
+    seen = set()
+    for index, asset_id in enumerate(asset_ids):
+        if asset_id in seen:
+            results.append(schemas.BulkRowResult(
+                index=index, status=schemas.BulkRowStatus.DUPLICATE, id=asset_id, detail="Asset id repeated in payload",
+            ))
+            continue
+        seen.add(asset_id)
+        rows.append((index, asset_id))
+
+    for chunk in _chunks(rows, chunk_size):
+        stmt = (
+            delete(models.Asset)
+            .where(models.Asset.id.in_([asset_id for _, asset_id in chunk]))
+            .returning(models.Asset.id)
+            .execution_options(synchronize_session=False)
+        )
+        try:
+            before = await _status_and_type(db, [asset_id for _, asset_id in chunk], lock=True)
+            # Registra o último estado antes do DELETE (apenas os IDs existentes entram no histórico)
+            await _add_history_events(db, schemas.AssetEventType.DELETED, before)
+            deleted = set((await db.execute(stmt)).scalars())
+            await _add_outbox_events(db, [outbox.asset_deleted(asset_id) for _, asset_id in chunk if asset_id in deleted])
+            await _apply_stats_delta(db, before=[before[asset_id] for asset_id in deleted])
+            await db.commit()
+            if deleted:
+                await asset_cache.invalidate(deleted)
+        except SQLAlchemyError as e:
+            await db.rollback()
+            logger.error(f"Falha ao remover lote de {len(chunk)} ativos: {e}")
+            results.extend(_row_error(index, "Database error", id=asset_id) for index, asset_id in chunk)
+            continue
+        results.extend(
+            schemas.BulkRowResult(
+                index=index,
+                status=schemas.BulkRowStatus.DELETED if asset_id in deleted else schemas.BulkRowStatus.NOT_FOUND,
+                id=asset_id,
+            )
+            for index, asset_id in chunk
+        )
+    return results
@@ -1,8 +1,12 @@
 import os
+from uuid import uuid4
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+import metrics
 
 # Carrega as variáveis de ambiente do arquivo .env
 load_dotenv()
@@ -14,9 +18,106 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if DATABASE_URL is None:
     raise ValueError("A variável de ambiente DATABASE_URL não foi definida.")
 
-engine = create_engine(DATABASE_URL)
+# --- CONFIGURAÇÕES DO POOL DE CONEXÕES ---
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800")) # Segundos; -1 desativa
+# Espera máxima por uma conexão livre antes de falhar a requisição (segundos)
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+
+# --- PREPARED STATEMENTS (asyncpg) ---
+# Cada conexão guarda até DB_STATEMENT_CACHE_SIZE consultas preparadas no servidor, evitando
+# o parse/planejamento a cada execução. Atrás do PgBouncer em modo transaction, a conexão do
+# servidor muda entre transações: DB_PGBOUNCER=true desativa os caches e usa nomes únicos.
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500"))
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() in ("1", "true", "yes")
+
+# Limite da verificação de prontidão (/health/ready), em segundos
+DB_HEALTH_TIMEOUT = float(os.getenv("DB_HEALTH_TIMEOUT", "2"))
+
+# --- RÉPLICAS DE LEITURA ---
+# URLs (separadas por vírgula) de réplicas do primário; vazio = todas as consultas no primário.
+# O roteamento e a verificação do atraso de replicação ficam em replicas.py
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+
+
+def to_async_url(url: str) -> URL:
+    """
+    Converte a URL síncrona para o driver assíncrono equivalente (asyncpg / aiosqlite).
+    """
+    async_url = make_url(url)
+    if async_url.drivername in ("postgresql", "postgresql+psycopg2"):
+        # O asyncpg sempre usa UTF-8 e não aceita o parâmetro client_encoding
+        async_url = async_url.set(drivername="postgresql+asyncpg").difference_update_query(["client_encoding"])
+    elif async_url.drivername == "sqlite":
+        async_url = async_url.set(drivername="sqlite+aiosqlite")
+    return async_url
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+
+
+def pool_options(url) -> dict:
+    # O SQLite usa um pool próprio que não aceita as opções de dimensionamento
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
+
+
+def connect_args(url) -> dict:
+    # Opções aceitas apenas pelo asyncpg (via dialeto do SQLAlchemy)
+    if make_url(url).drivername != "postgresql+asyncpg":
+        return {}
+    if DB_PGBOUNCER:
+        return {
+            "statement_cache_size": 0, # Cache do próprio asyncpg
+            "prepared_statement_cache_size": 0, # Cache do dialeto do SQLAlchemy
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    return {"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+
+
+engine = create_engine(DATABASE_URL, **pool_options(DATABASE_URL))
 # --- FIM DA CORREÇÃO ---
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base()
\ No newline at end of file
+# Engine e sessões assíncronas usadas pelos endpoints e pelo consumidor,
+# para que nenhuma consulta bloqueie o event loop. Nenhuma conexão é aberta aqui: a primeira
+# sai do pool na primeira requisição (ou no /health/ready)
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    connect_args=connect_args(ASYNC_DATABASE_URL),
+    poolclass=metrics.pool_class(), # Mede a espera por conexões (db_pool_wait_seconds)
+    **pool_options(ASYNC_DATABASE_URL),
+)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# Uma engine (e um pool) por réplica, com as mesmas opções do primário
+replica_engines = [
+    create_async_engine(
+        to_async_url(url),
+        connect_args=connect_args(to_async_url(url)),
+        poolclass=metrics.pool_class(replica=True), # Fora do ajuste do prefetch do consumidor
+        **pool_options(url),
+    )
+    for url in DATABASE_REPLICA_URLS
+]
+
+Base = declarative_base()
+
+
+async def ping() -> None:
+    """
+    Executa uma consulta trivial pelo pool assíncrono; lança exceção se o banco não responder.
+    """
+    async with async_engine.connect() as connection:
+        await connection.execute(text("SELECT 1"))
@@ -0,0 +1,93 @@
+import hashlib
+import re
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+# ETags dos ativos: a versão da linha (coluna assets.version), incrementada a cada escrita. São
+# fracos (W/"N"): a mesma versão é servida em JSON puro, gzip ou brotli (compression.py), com
+# bytes diferentes. If-Match compara a versão, com ou sem W/; If-None-Match usa comparação
+# fraca, e as páginas de GET /assets/ recebem ETags fracos calculados do conteúdo.
+
+_ENTITY_TAG = re.compile(r'\s*(W/)?"([^"]*)"\s*(?:,|$)')
+
+
+def asset_etag(version: int) -> str:
+    return f'W/"{version}"'
+
+
+def parse_if_match(header: str | None) -> set[int] | None:
+    """
+    Versões aceitas pelo cabeçalho If-Match. None quando não há condição (cabeçalho ausente
+    ou "*"); conjunto vazio quando nenhuma tag é válida, o que sempre resulta em 412.
+    O prefixo W/ é ignorado: a tag identifica a versão da linha, não os bytes da resposta.
+    """
+    if header is None or header.strip() == "*":
+        return None
+    versions = set()
+    for _, value in _ENTITY_TAG.findall(header):
+        if value.isdigit():
+            versions.add(int(value))
+    return versions
+
+
+def page_etag(page: dict) -> str:
+    """
+    ETag fraco de uma página de listagem: muda quando um item entra, sai ou muda de versão.
+    """
+    digest = hashlib.sha1()
+    for item in page["items"]:
+        digest.update(f"{item['id']}:{item.get('version')};".encode())
+    digest.update(str(page.get("next_cursor")).encode())
+    return f'W/"{digest.hexdigest()[:20]}"'
+
+
+def _as_datetime(value) -> datetime | None:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def last_modified(*values) -> str | None:
+    """
+    Cabeçalho Last-Modified (data HTTP) a partir do mais recente entre os timestamps informados.
+    """
+    moments = [moment for moment in map(_as_datetime, values) if moment is not None]
+    if not moments:
+        return None
+    return format_datetime(max(moments).astimezone(timezone.utc), usegmt=True)
+
+
+def validators(etag: str, modified: str | None) -> dict:
+    # no-cache: o navegador pode guardar a resposta, mas revalida (If-None-Match) a cada uso
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if modified is not None:
+        headers["Last-Modified"] = modified
+    return headers
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def is_not_modified(request_headers, response_headers: dict) -> bool:
+    """
+    Avalia If-None-Match (comparação fraca) ou, na ausência dele, If-Modified-Since.
+    """
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        etag = _opaque(response_headers["ETag"])
+        return any(f'"{value}"' == etag for _, value in _ENTITY_TAG.findall(if_none_match))
+
+    if_modified_since = request_headers.get("if-modified-since")
+    modified = response_headers.get("Last-Modified")
+    if if_modified_since and modified:
+        try:
+            return parsedate_to_datetime(modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
@@ -0,0 +1,39 @@
+import csv
+import io
+from typing import AsyncIterator
+
+import crud, schemas
+from database import AsyncSessionLocal
+
+# Quantidade de linhas buscadas por vez no cursor do servidor durante a exportação
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_COLUMNS = list(schemas.Asset.model_fields)
+
+
+async def _iter_batches(filters: schemas.AssetFilter | None, session_factory) -> AsyncIterator[list[dict]]:
+    # A sessão é aberta pelo próprio gerador: o streaming continua depois que o endpoint retorna
+    async with session_factory() as db:
+        async for rows in crud.stream_asset_rows(db, batch_size=EXPORT_BATCH_SIZE, filters=filters):
+            yield rows
+
+
+async def stream_ndjson(
+    filters: schemas.AssetFilter | None = None, session_factory=AsyncSessionLocal
+) -> AsyncIterator[bytes]:
+    # Um bloco por lote em vez de um chunk HTTP por linha
+    async for rows in _iter_batches(filters, session_factory):
+        yield b"".join(schemas.asset_row_adapter.dump_json(row) + b"\n" for row in rows)
+
+
+async def stream_csv(filters: schemas.AssetFilter | None = None, session_factory=AsyncSessionLocal) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    async for rows in _iter_batches(filters, session_factory):
+        # mode="json" formata enums e datas como no NDJSON
+        writer.writerows(schemas.asset_row_adapter.dump_python(row, mode="json").values() for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
@@ -0,0 +1,309 @@
+"""
+Feed de mudanças dos ativos (GET /assets/stream via SSE e /assets/stream/ws via WebSocket).
+
+Substitui o polling do painel: em vez de reconsultar a lista, o cliente recebe um delta por
+mudança (id do evento, ativo, tipo, status, atribuição, horário e os campos gravados: a linha
+inteira em `created`, só o que mudou em `updated`), lido de `asset_events`, o histórico gravado
+na mesma transação de toda alteração — pela API, pela carga em lote ou pelo consumidor de
+checkout, em qualquer processo. O cliente aplica o delta sem consultar o ativo de novo.
+
+Um único poller por processo lê os eventos novos enquanto houver assinantes e os distribui
+em memória. Cada evento é serializado uma vez e o mesmo frame é enfileirado para todos os
+clientes, assim como o heartbeat; uma conexão ociosa custa só a fila e a tarefa que espera
+nela, sem timers próprios. A fila de cada cliente é limitada: quem não acompanha é
+desconectado e, ao reconectar com Last-Event-ID, recebe o que perdeu (do buffer recente ou do
+banco) ou um evento `reset` quando o atraso passa de FEED_REPLAY_LIMIT, para recarregar a lista.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import func, or_, select
+
+import metrics
+import models
+import schemas
+from database import AsyncSessionLocal
+from replicas import read_router
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURAÇÕES DO FEED ---
+FEED_ENABLED = os.getenv("CHANGE_FEED_ENABLED", "true").lower() in ("1", "true", "yes")
+# Espera entre consultas a asset_events quando não há eventos novos
+FEED_POLL_INTERVAL_MS = int(os.getenv("CHANGE_FEED_POLL_INTERVAL_MS", "200"))
+# Eventos lidos por consulta do poller
+FEED_BATCH_SIZE = int(os.getenv("CHANGE_FEED_BATCH_SIZE", "500"))
+# Eventos recentes mantidos em memória para reconexões com Last-Event-ID
+FEED_BUFFER_SIZE = int(os.getenv("CHANGE_FEED_BUFFER_SIZE", "10000"))
+# Eventos pendentes por cliente antes de desconectá-lo por lentidão
+FEED_CLIENT_QUEUE_SIZE = int(os.getenv("CHANGE_FEED_CLIENT_QUEUE_SIZE", "1000"))
+# Máximo de eventos reenviados do banco numa reconexão; acima disso o cliente recebe `reset`
+FEED_REPLAY_LIMIT = int(os.getenv("CHANGE_FEED_REPLAY_LIMIT", "5000"))
+FEED_MAX_SUBSCRIBERS = int(os.getenv("CHANGE_FEED_MAX_SUBSCRIBERS", "10000"))
+# Comentário/ping enviado a conexões sem eventos, para detectar clientes desconectados e
+# manter proxies abertos
+FEED_HEARTBEAT_SECONDS = float(os.getenv("CHANGE_FEED_HEARTBEAT_SECONDS", "15"))
+# Espera sugerida ao EventSource antes de reconectar (campo `retry`)
+FEED_RETRY_MS = int(os.getenv("CHANGE_FEED_RETRY_MS", "3000"))
+# Ids pulados (transações ainda não confirmadas) são reconsultados por este tempo
+FEED_GAP_TIMEOUT_SECONDS = float(os.getenv("CHANGE_FEED_GAP_TIMEOUT_SECONDS", "10"))
+# Tempo máximo para o poller ficar pronto ao abrir uma conexão
+FEED_READY_TIMEOUT_SECONDS = float(os.getenv("CHANGE_FEED_READY_TIMEOUT_SECONDS", "5"))
+
+# Frames de controle (o do WebSocket é uma mensagem JSON com o campo "event")
+SSE_RESET = "event: reset\ndata: {}\n\n"
+SSE_PING = ": ping\n\n"
+WS_RESET = '{"event":"reset"}'
+WS_PING = '{"event":"ping"}'
+
+_EVICTED = object() # Sentinela enfileirada para encerrar a conexão de um cliente lento
+_PING = object() # Heartbeat enfileirado pelo poller, sem um timer por conexão
+
+
+class FeedUnavailable(Exception):
+    pass
+
+
+class FeedEvent:
+    """
+    Um delta já serializado nos dois formatos, compartilhado por todos os assinantes.
+    """
+
+    __slots__ = ("id", "sse", "ws")
+
+    def __init__(self, event: models.AssetEvent):
+        self.id = event.id
+        data = schemas.AssetEvent.model_validate(event).model_dump_json()
+        self.sse = f"id: {event.id}\nevent: asset\ndata: {data}\n\n"
+        self.ws = f'{{"event":"asset","data":{data}}}'
+
+
+class Subscription:
+    __slots__ = ("queue",)
+
+    def __init__(self, maxsize: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+
+class ChangeFeed:
+    """
+    Distribui os eventos de `asset_events` aos assinantes do processo.
+
+    O poller só consulta o banco enquanto há assinantes. Ao voltar da ociosidade ele recomeça
+    do maior id atual (o que aconteceu sem ninguém conectado não é entregue como ao vivo) e
+    descarta o buffer, que deixa de cobrir o intervalo; reconexões com Last-Event-ID anteriores
+    passam a ser atendidas pelo banco.
+    """
+
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        buffer_size: int = FEED_BUFFER_SIZE,
+        client_queue_size: int = FEED_CLIENT_QUEUE_SIZE,
+        replay_limit: int = FEED_REPLAY_LIMIT,
+        max_subscribers: int = FEED_MAX_SUBSCRIBERS,
+        batch_size: int = FEED_BATCH_SIZE,
+    ):
+        self.session_factory = session_factory
+        self.client_queue_size = client_queue_size
+        self.replay_limit = replay_limit
+        self.max_subscribers = max_subscribers
+        self.batch_size = batch_size
+        self.subscriptions: set[Subscription] = set()
+        self.recent: deque[FeedEvent] = deque(maxlen=buffer_size)
+        self.last_id: Optional[int] = None # Maior id já distribuído
+        self._floor = 0 # O buffer contém todos os eventos com id > _floor
+        self._gaps: dict[int, float] = {} # Ids pulados → quando deixam de ser reconsultados
+        self._active = asyncio.Event() # Há assinantes
+        self._ready = asyncio.Event() # last_id inicializado desde a última ociosidade
+        self.published = 0
+        self.evicted = 0
+
+    # --- ASSINANTES ---
+
+    def subscribe(self) -> Subscription:
+        if len(self.subscriptions) >= self.max_subscribers:
+            raise FeedUnavailable("Limite de conexões do feed atingido.")
+        subscription = Subscription(self.client_queue_size)
+        self.subscriptions.add(subscription)
+        self._active.set()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self.subscriptions.discard(subscription)
+        if not self.subscriptions:
+            self._active.clear()
+
+    def _evict(self, subscription: Subscription) -> None:
+        # Descarta o que estava pendente e acorda o leitor, que encerra a conexão
+        self.unsubscribe(subscription)
+        queue = subscription.queue
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(_EVICTED)
+        self.evicted += 1
+
+    def _broadcast(self, items: list) -> None:
+        for subscription in list(self.subscriptions):
+            put = subscription.queue.put_nowait
+            try:
+                for item in items:
+                    put(item)
+            except asyncio.QueueFull:
+                self._evict(subscription)
+
+    def publish(self, events: list[FeedEvent]) -> None:
+        recent = self.recent
+        for event in events:
+            if len(recent) == recent.maxlen:
+                self._floor = max(self._floor, recent[0].id)
+            recent.append(event)
+        self._broadcast(events)
+        self.published += len(events)
+
+    async def open(self, last_event_id: Optional[int]) -> tuple[Subscription, Optional[list[FeedEvent]]]:
+        """
+        Registra um assinante e monta o que ele perdeu desde `last_event_id`: a lista de eventos
+        a reenviar antes dos ao vivo, ou None se o atraso exige um `reset`.
+        """
+        subscription = self.subscribe()
+        try:
+            await asyncio.wait_for(self._ready.wait(), FEED_READY_TIMEOUT_SECONDS)
+            # Eventos posteriores a last_id já vão para a fila do assinante
+            backlog = [] if last_event_id is None else await self.replay(last_event_id, self.last_id)
+        except asyncio.TimeoutError:
+            self.unsubscribe(subscription)
+            raise FeedUnavailable("O feed de mudanças não está disponível.")
+        except BaseException:
+            self.unsubscribe(subscription)
+            raise
+        return subscription, backlog
+
+    async def replay(self, after_id: int, up_to: int) -> Optional[list[FeedEvent]]:
+        if after_id >= up_to:
+            return []
+        if after_id >= self._floor:
+            return sorted((event for event in self.recent if after_id < event.id <= up_to), key=lambda event: event.id)
+
+        async with self.session_factory() as db:
+            query = (
+                select(models.AssetEvent)
+                .where(models.AssetEvent.id > after_id, models.AssetEvent.id <= up_to)
+                .order_by(models.AssetEvent.id)
+                .limit(self.replay_limit + 1)
+            )
+            events = (await db.execute(query)).scalars().all()
+        if len(events) > self.replay_limit:
+            return None
+        return [FeedEvent(event) for event in events]
+
+    # --- LEITURA DOS EVENTOS ---
+
+    async def _start(self) -> None:
+        async with self.session_factory() as db:
+            self.last_id = await db.scalar(select(func.max(models.AssetEvent.id))) or 0
+        self.recent.clear()
+        self._floor = self.last_id
+        self._gaps.clear()
+        self._ready.set()
+
+    async def poll_once(self) -> int:
+        """
+        Lê e distribui os eventos com id > last_id (e os pulados ainda em espera). Retorna
+        quantos eventos novos foram lidos.
+        """
+        condition = models.AssetEvent.id > self.last_id
+        if self._gaps:
+            # Um id menor pode aparecer depois: a transação que o reservou ainda não tinha
+            # confirmado quando os seguintes foram lidos
+            condition = or_(condition, models.AssetEvent.id.in_(list(self._gaps)))
+        async with self.session_factory() as db:
+            query = select(models.AssetEvent).where(condition).order_by(models.AssetEvent.id).limit(self.batch_size)
+            rows = (await db.execute(query)).scalars().all()
+
+        now = time.monotonic()
+        new = 0
+        expected = self.last_id + 1
+        for row in rows:
+            if self._gaps.pop(row.id, None) is not None:
+                continue
+            new += 1
+            for missing in range(expected, row.id):
+                self._gaps[missing] = now + FEED_GAP_TIMEOUT_SECONDS
+            expected = row.id + 1
+        self._gaps = {gap: until for gap, until in self._gaps.items() if until > now}
+        if rows:
+            self.last_id = max(self.last_id, rows[-1].id)
+            self.publish([FeedEvent(row) for row in rows])
+        return new
+
+    async def run(self, poll_interval_ms: int = FEED_POLL_INTERVAL_MS) -> None:
+        next_heartbeat = 0.0
+        while True:
+            if not self.subscriptions:
+                self._ready.clear()
+                await self._active.wait()
+            if time.monotonic() >= next_heartbeat:
+                # Quem já tem eventos pendentes não precisa do ping, mas enfileirá-lo é mais barato que verificar
+                self._broadcast([_PING])
+                next_heartbeat = time.monotonic() + FEED_HEARTBEAT_SECONDS
+            new = 0
+            try:
+                if not self._ready.is_set():
+                    await self._start()
+                new = await self.poll_once()
+            except Exception as e:
+                logger.error(f"Erro no feed de mudanças: {e}")
+            # Lote cheio indica que há mais eventos: segue sem esperar
+            if new < self.batch_size:
+                await asyncio.sleep(poll_interval_ms / 1000)
+
+    # --- ENTREGA ---
+
+    async def frames(
+        self, subscription: Subscription, backlog: Optional[list[FeedEvent]], websocket: bool = False
+    ) -> AsyncIterator[str]:
+        """
+        Frames de uma conexão: o backlog (ou `reset`), depois os eventos ao vivo com pings nos
+        intervalos. Termina quando o cliente é desconectado por lentidão.
+        """
+        reset, ping = (WS_RESET, WS_PING) if websocket else (SSE_RESET, SSE_PING)
+        field = "ws" if websocket else "sse"
+        metrics.feed_subscribers.inc()
+        try:
+            if not websocket:
+                yield f"retry: {FEED_RETRY_MS}\n\n"
+            if backlog is None:
+                yield reset
+            else:
+                for event in backlog:
+                    yield getattr(event, field)
+            queue = subscription.queue
+            while True:
+                event = await queue.get()
+                if event is _PING:
+                    yield ping
+                    continue
+                if event is _EVICTED:
+                    metrics.feed_evictions_total.inc()
+                    return
+                yield getattr(event, field)
+        finally:
+            self.unsubscribe(subscription)
+            metrics.feed_subscribers.dec()
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+# Com réplicas, o feed lê da réplica: um delta nunca chega antes de a leitura que ele dispara
+# no painel (GET /assets/{id}) poder enxergá-lo
+change_feed = ChangeFeed(session_factory=read_router.session)
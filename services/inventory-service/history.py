@@ -0,0 +1,157 @@
+"""
+Manutenção das partições mensais de asset_events (apenas PostgreSQL).
+
+Cada mês tem a sua partição (asset_events_pAAAAMM, limites em UTC); a partição default recebe
+o que cair fora delas, para que uma escrita em 'assets' nunca falhe por falta de partição.
+Partições além da retenção são desanexadas (e opcionalmente removidas): a operação trava apenas
+asset_events, por um instante, e nunca a tabela 'assets'.
+"""
+import asyncio
+import logging
+import os
+import re
+from datetime import date, datetime, timezone
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from database import async_engine
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURAÇÕES DO HISTÓRICO ---
+HISTORY_MAINTENANCE_ENABLED = os.getenv("HISTORY_MAINTENANCE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Partições criadas com antecedência (meses além do atual)
+HISTORY_PARTITION_MONTHS_AHEAD = int(os.getenv("HISTORY_PARTITION_MONTHS_AHEAD", "3"))
+# Meses mantidos anexados à tabela; 0 mantém todo o histórico
+HISTORY_RETENTION_MONTHS = int(os.getenv("HISTORY_RETENTION_MONTHS", "0"))
+# "detach" deixa a partição antiga como tabela avulsa (para arquivar com pg_dump); "drop" a remove
+HISTORY_PRUNE_MODE = os.getenv("HISTORY_PRUNE_MODE", "detach")
+HISTORY_MAINTENANCE_INTERVAL_SECONDS = int(os.getenv("HISTORY_MAINTENANCE_INTERVAL_SECONDS", "86400"))
+# Evita que o DETACH fique enfileirado atrás de transações longas, bloqueando as escritas
+HISTORY_LOCK_TIMEOUT = os.getenv("HISTORY_LOCK_TIMEOUT", "5s")
+
+PARENT_TABLE = "asset_events"
+PARTITION_PATTERN = re.compile(rf"^{PARENT_TABLE}_p(\d{{4}})(\d{{2}})$")
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_p{month:%Y%m}"
+
+
+def create_partition_sql(month: date) -> str:
+    start, end = month, add_months(month, 1)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{start:%Y-%m-%d} 00:00:00+00') TO ('{end:%Y-%m-%d} 00:00:00+00')"
+    )
+
+
+def _current_month(today: Optional[date] = None) -> date:
+    today = today or datetime.now(timezone.utc).date()
+    return today.replace(day=1)
+
+
+async def is_partitioned(conn: AsyncConnection) -> bool:
+    # Bancos criados por create_all (sem a migração) têm uma tabela comum
+    relkind = await conn.scalar(text(f"SELECT relkind FROM pg_class WHERE oid = to_regclass('{PARENT_TABLE}')"))
+    return relkind == "p"
+
+
+async def ensure_partitions(conn: AsyncConnection, months_ahead: int = HISTORY_PARTITION_MONTHS_AHEAD, today: Optional[date] = None) -> list[str]:
+    """
+    Cria as partições do mês atual e dos próximos `months_ahead` meses. Retorna as criadas.
+    A conexão deve estar em AUTOCOMMIT, para que a falha de uma partição não afete as demais.
+    """
+    existing = set(await list_partitions(conn))
+    created = []
+    month = _current_month(today)
+    for offset in range(months_ahead + 1):
+        target = add_months(month, offset)
+        name = partition_name(target)
+        if name in existing:
+            continue
+        try:
+            await conn.execute(text(create_partition_sql(target)))
+            created.append(name)
+        except Exception as e:
+            # Ex.: a partição default já tem linhas do intervalo
+            logger.error(f"Falha ao criar a partição {name}: {e}")
+    return created
+
+
+async def list_partitions(conn: AsyncConnection) -> list[str]:
+    result = await conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        f"WHERE i.inhparent = to_regclass('{PARENT_TABLE}') ORDER BY c.relname"
+    ))
+    return list(result.scalars())
+
+
+async def prune_partitions(
+    conn: AsyncConnection,
+    retention_months: int = HISTORY_RETENTION_MONTHS,
+    mode: str = HISTORY_PRUNE_MODE,
+    today: Optional[date] = None,
+) -> list[str]:
+    """
+    Desanexa (mode="detach") ou remove (mode="drop") as partições inteiramente anteriores à
+    retenção. Retorna as partições tratadas.
+    """
+    if retention_months <= 0:
+        return []
+    cutoff = add_months(_current_month(today), -retention_months)
+    pruned = []
+    for name in await list_partitions(conn):
+        match = PARTITION_PATTERN.match(name)
+        if not match or date(int(match.group(1)), int(match.group(2)), 1) >= cutoff:
+            continue
+        try:
+            await conn.execute(text(f"SET lock_timeout = '{HISTORY_LOCK_TIMEOUT}'"))
+            await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+            if mode == "drop":
+                await conn.execute(text(f"DROP TABLE {name}"))
+            pruned.append(name)
+        except Exception as e:
+            logger.error(f"Falha ao remover a partição {name}: {e}")
+        finally:
+            await conn.execute(text("RESET lock_timeout"))
+    return pruned
+
+
+async def maintain_once() -> None:
+    async with async_engine.connect() as conn:
+        if conn.dialect.name != "postgresql":
+            return
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        if not await is_partitioned(conn):
+            logger.warning(f"A tabela {PARENT_TABLE} não é particionada; rode as migrações do Alembic.")
+            return
+        created = await ensure_partitions(conn)
+        pruned = await prune_partitions(conn)
+        if created or pruned:
+            logger.info(f"Partições do histórico criadas: {created}; {HISTORY_PRUNE_MODE}: {pruned}")
+
+
+async def run_history_maintenance() -> None:
+    """
+    Mantém as partições do histórico periodicamente até a tarefa ser cancelada.
+    """
+    while True:
+        try:
+            await maintain_once()
+        except Exception as e:
+            logger.error(f"Erro na manutenção do histórico: {e}")
+        await asyncio.sleep(HISTORY_MAINTENANCE_INTERVAL_SECONDS)
+
+
+if __name__ == "__main__":
+    # Permite rodar a manutenção isoladamente (ex.: cron)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(maintain_once())
@@ -0,0 +1,96 @@
+"""
+Tarefas de manutenção em segundo plano, executadas por um único processo por vez.
+
+São o relay da outbox (com a limpeza dos eventos já publicados), as partições do histórico, a
+verificação de asset_stats e a limpeza do ledger de mensagens processadas. Os processos que as
+hospedam (a API com BACKGROUND_JOBS_EMBEDDED=true e o primeiro processo do worker.py) disputam
+um advisory lock de sessão do PostgreSQL: só o processo que o obtém roda as tarefas; os demais
+tentam de novo a cada BACKGROUND_JOBS_RETRY_SECONDS e assumem se ele cair (o lock é liberado com
+a conexão). A primeira tentativa espera BACKGROUND_JOBS_START_DELAY_SECONDS, para que a
+inicialização não toque o banco. No SQLite (um processo só, em testes e benchmarks) não há lock.
+
+O lock usa uma conexão própria, fora do pool das requisições. Atrás do PgBouncer em modo
+transaction, ASYNC_DATABASE_URL precisa apontar direto para o PostgreSQL nos processos que
+hospedam as tarefas, pois o lock de sessão não sobrevive à troca de conexão do servidor.
+"""
+import asyncio
+import logging
+import os
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+import aggregates
+import consumer
+import database
+import history
+import outbox
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURAÇÕES DAS TAREFAS ---
+# "false" = a API não hospeda as tarefas, que ficam só com o worker.py
+BACKGROUND_JOBS_EMBEDDED = os.getenv("BACKGROUND_JOBS_EMBEDDED", "true").lower() in ("1", "true", "yes")
+BACKGROUND_JOBS_START_DELAY_SECONDS = float(os.getenv("BACKGROUND_JOBS_START_DELAY_SECONDS", "10"))
+# Intervalo entre tentativas de obter o lock e entre verificações da conexão que o mantém
+BACKGROUND_JOBS_RETRY_SECONDS = float(os.getenv("BACKGROUND_JOBS_RETRY_SECONDS", "30"))
+# Chave do advisory lock (a do relay da outbox é a anterior)
+BACKGROUND_JOBS_LOCK_ID = 0x0A55E8
+
+
+def job_factories() -> list:
+    jobs = []
+    if outbox.OUTBOX_RELAY_ENABLED:
+        jobs.append(outbox.run_outbox_relay)
+    if history.HISTORY_MAINTENANCE_ENABLED:
+        jobs.append(history.run_history_maintenance)
+    if aggregates.STATS_RECONCILE_ENABLED:
+        jobs.append(aggregates.run_stats_reconciler)
+    jobs.append(consumer.prune_ledger_periodically)
+    return jobs
+
+
+async def _lead(connection, retry_seconds: float) -> None:
+    # Roda as tarefas enquanto a conexão do lock responder; se ela cair, outro processo pode
+    # ter assumido e as tarefas param aqui
+    tasks = [asyncio.create_task(job()) for job in job_factories()]
+    try:
+        while True:
+            await asyncio.sleep(retry_seconds)
+            if connection is not None:
+                await connection.scalar(select(1))
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def run_background_jobs(
+    start_delay: float = BACKGROUND_JOBS_START_DELAY_SECONDS, retry_seconds: float = BACKGROUND_JOBS_RETRY_SECONDS,
+) -> None:
+    """
+    Disputa o lock e, com ele, roda as tarefas de manutenção até a tarefa ser cancelada.
+    """
+    await asyncio.sleep(start_delay)
+    lock_engine = create_async_engine(
+        database.ASYNC_DATABASE_URL, connect_args=database.connect_args(database.ASYNC_DATABASE_URL), poolclass=NullPool,
+    )
+    try:
+        if lock_engine.dialect.name != "postgresql":
+            await _lead(None, retry_seconds)
+            return
+        while True:
+            try:
+                async with lock_engine.connect() as connection:
+                    # O lock é de sessão e dura enquanto a conexão existir; sem transação aberta nela
+                    connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+                    locked = await connection.scalar(select(func.pg_try_advisory_lock(BACKGROUND_JOBS_LOCK_ID)))
+                    if locked:
+                        logger.info(f"Processo {os.getpid()} assumiu as tarefas de manutenção.")
+                        await _lead(connection, retry_seconds)
+            except Exception as e:
+                logger.error(f"Erro nas tarefas de manutenção: {e}")
+            await asyncio.sleep(retry_seconds)
+    finally:
+        await lock_engine.dispose()
@@ -1,28 +1,71 @@
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
-import crud, models, schemas
-from database import SessionLocal, engine
+from datetime import datetime
+from enum import Enum
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+import admission, bulk, compression, crud, export, models, schemas
+import cache
+from cache import asset_cache
+from pagination import decode_cursor, encode_cursor
+import database
+from database import AsyncSessionLocal, async_engine
+import etags
+import feed
+from feed import change_feed
+import metrics
+import replicas
+from replicas import read_router
 import security
 from fastapi.middleware.cors import CORSMiddleware
 import asyncio
+import time
 import consumer
+import jobs
 
-models.Base.metadata.create_all(bind=engine)
+if metrics.METRICS_ENABLED:
+    metrics.instrument_engine(async_engine.sync_engine)
+    for replica in read_router.replicas:
+        metrics.instrument_engine(replica.engine.sync_engine, replica.name)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Código executado na inicialização
-    print("Iniciando o consumidor de eventos...")
-    consumer_task = asyncio.create_task(consumer.consume_checkout_events()) # Inicia o consumidor assíncrono
+    tasks = []
+    consumer_task = None
+    consumer_stop = asyncio.Event()
+    # Com CHECKOUT_CONSUMER_EMBEDDED=false a API roda só como web e o consumo fica com o worker.py,
+    # cujas escritas precisam invalidar o cache desta API
+    if not consumer.CONSUMER_EMBEDDED and not cache.shared_between_processes():
+        raise RuntimeError("CHECKOUT_CONSUMER_EMBEDDED=false exige CACHE_BACKEND=redis (ou none).")
+    if consumer.CONSUMER_EMBEDDED:
+        print("Iniciando o consumidor de eventos...")
+        consumer_task = asyncio.create_task(consumer.consume_checkout_events(consumer_stop)) # Inicia o consumidor assíncrono
+    if jobs.BACKGROUND_JOBS_EMBEDDED:
+        # Relay da outbox e manutenção: só no processo que obtiver o lock, depois de um atraso
+        tasks.append(asyncio.create_task(jobs.run_background_jobs()))
+    if read_router.enabled:
+        tasks.append(asyncio.create_task(read_router.run())) # Atraso de replicação de cada réplica
+    if feed.FEED_ENABLED:
+        tasks.append(asyncio.create_task(change_feed.run())) # Só consulta o banco enquanto houver assinantes
     yield # O yield é onde o FastAPI começa a receber requisições
     # Código executado no shutdown
-    print("Parando o consumidor de eventos...")
-    consumer_task.cancel() # Cancela a tarefa do consumidor
-    try:
-        await consumer_task # Aguarda a tarefa ser cancelada
-    except asyncio.CancelledError:
-        print("Consumidor parado.")
+    print("Parando as tarefas em segundo plano...")
+    if consumer_task is not None:
+        # Termina e confirma os lotes já recebidos antes de desconectar
+        consumer_stop.set()
+        try:
+            await asyncio.wait_for(consumer_task, consumer.DRAIN_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            print("Tempo de drenagem do consumidor esgotado.")
+    for task in tasks:
+        task.cancel() # Cancela as tarefas em segundo plano
+    for task in tasks:
+        try:
+            await task # Aguarda a tarefa ser cancelada
+        except asyncio.CancelledError:
+            pass
+    print("Tarefas em segundo plano paradas.")
 
 app = FastAPI(
     title="AssetForge - Inventory Service",
@@ -31,70 +74,415 @@ app = FastAPI(
     lifespan=lifespan # Adiciona o lifespan ao app
 )
 
+# Orçamentos de concorrência por tipo de rota, com 429 + Retry-After quando a fila enche. É o
+# middleware mais interno: o 429 recebe os cabeçalhos CORS e entra nas métricas HTTP
+if admission.ADMISSION_ENABLED:
+    app.add_middleware(admission.AdmissionMiddleware, scheduler=admission.scheduler)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],  # Permitir apenas o frontend
     allow_credentials=True,
     allow_methods=["*"],  # Permitir todos os métodos
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "ETag", "Last-Modified", "Retry-After"],
 )
 
-# Função de Dependência do Banco de Dados
-def get_db():
-    db = SessionLocal()
+# Cookie de read-your-writes nas respostas às escritas (só faz sentido com réplicas)
+if read_router.enabled and replicas.READ_YOUR_WRITES_SECONDS:
+    app.add_middleware(replicas.ReadYourWritesMiddleware)
+
+# Compressão por dentro do middleware de métricas, que repassa o corpo em blocos (streaming) e
+# impediria a verificação do tamanho mínimo
+if compression.COMPRESSION_ENABLED:
+    app.add_middleware(compression.CompressionMiddleware)
+
+# Latência e volume por rota (e, opcionalmente, o cabeçalho Server-Timing)
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    if not metrics.METRICS_ENABLED:
+        return await call_next(request)
+
+    timing = metrics.RequestTiming()
+    token = metrics.current_timing.set(timing)
+    metrics.http_requests_in_progress.inc(method=request.method)
+    started = time.perf_counter()
+    status_code = 500
     try:
-        yield db
+        response = await call_next(request)
+        status_code = response.status_code
     finally:
-        db.close()
+        elapsed = time.perf_counter() - started
+        metrics.http_requests_in_progress.dec(method=request.method)
+        metrics.current_timing.reset(token)
+        # O template da rota (ex.: /assets/{asset_id}) evita uma série por ID
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        metrics.http_requests_total.inc(method=request.method, route=route, status=status_code)
+        metrics.http_request_duration_seconds.observe(elapsed, method=request.method, route=route)
+
+    if metrics.TIMING_HEADERS_ENABLED:
+        response.headers["Server-Timing"] = timing.server_timing(elapsed)
+    return response
+
+# Função de Dependência do Banco de Dados
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Sessão dos GETs: réplica saudável, ou o primário se não houver uma ou se o cliente escreveu há pouco
+async def get_read_db(request: Request):
+    async with read_router.session(primary=replicas.wants_primary(request.cookies)) as db:
+        yield db
 
 # --- ENDPOINTS DE /assets/ ---
 
 @app.post("/assets/", response_model=schemas.Asset)
-def create_new_asset(
+async def create_new_asset(
     asset: schemas.AssetCreate,
-    db: Session = Depends(get_db),
+    response: Response,
+    db: AsyncSession = Depends(get_db),
     current_user: security.TokenData = Depends(security.get_current_user),
 ):
-    db_asset = db.query(models.Asset).filter(models.Asset.serial_number == asset.serial_number).first()
+    db_asset = await crud.get_asset_by_serial_number(db, serial_number=asset.serial_number)
     if db_asset:
         raise HTTPException(status_code=400, detail="Serial number already registered")
-    return crud.create_asset(db=db, asset=asset)
+    db_asset = await crud.create_asset(db=db, asset=asset)
+    # ETag para o primeiro If-Match do cliente, sem precisar de um GET antes
+    response.headers.update(asset_validators(db_asset.version, db_asset.created_at, db_asset.updated_at))
+    return db_asset
+
+# Filtros de listagem compartilhados por GET /assets/ e GET /assets/export
+def asset_filters(
+    status: models.AssetStatus | None = None,
+    asset_type: models.AssetType | None = None,
+    assigned_to: int | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    updated_from: datetime | None = None,
+    updated_to: datetime | None = None,
+    q: str | None = Query(None, min_length=1, max_length=100, description="Busca em name e model"),
+) -> schemas.AssetFilter:
+    return schemas.AssetFilter(
+        status=status,
+        asset_type=asset_type,
+        assigned_to=assigned_to,
+        created_from=created_from,
+        created_to=created_to,
+        updated_from=updated_from,
+        updated_to=updated_to,
+        q=q,
+    )
+
+# --- OPERAÇÕES EM MASSA (declaradas antes das rotas com {asset_id}) ---
+
+@app.post("/assets/bulk", response_model=schemas.BulkResult, openapi_extra=bulk.BULK_REQUEST_BODY)
+async def bulk_create_assets(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: security.TokenData = Depends(security.get_current_user),
+):
+    # Aceita um array JSON de AssetCreate ou um CSV com as mesmas colunas
+    rows = await bulk.read_rows(request)
+    valid, results = bulk.validate_rows(rows, schemas.AssetCreate)
+    results += await crud.bulk_create_assets(db, valid, chunk_size=bulk.BULK_CHUNK_SIZE)
+    return bulk.summarize(results)
+
+@app.patch("/assets/bulk", response_model=schemas.BulkResult, openapi_extra=bulk.BULK_REQUEST_BODY)
+async def bulk_update_assets(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: security.TokenData = Depends(security.get_current_user),
+):
+    # Cada linha traz o id do ativo e apenas os campos a alterar
+    rows = await bulk.read_rows(request)
+    valid, results = bulk.validate_rows(rows, schemas.AssetBulkUpdate)
+    results += await crud.bulk_update_assets(db, valid, chunk_size=bulk.BULK_CHUNK_SIZE)
+    return bulk.summarize(results)
+
+@app.delete("/assets/bulk", response_model=schemas.BulkResult)
+async def bulk_delete_assets(
+    payload: schemas.AssetBulkDelete,
+    db: AsyncSession = Depends(get_db),
+    current_user: security.TokenData = Depends(security.get_current_user),
+):
+    if len(payload.ids) > bulk.BULK_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {bulk.BULK_MAX_ROWS} rows per request")
+    results = await crud.bulk_delete_assets(db, payload.ids, chunk_size=bulk.BULK_CHUNK_SIZE)
+    return bulk.summarize(results)
+
+# --- REQUISIÇÕES CONDICIONAIS (ETag / Last-Modified → 304) ---
+
+def conditional_response(request: Request, data: dict | str, headers: dict) -> Response:
+    if etags.is_not_modified(request.headers, headers):
+        return Response(status_code=304, headers=headers)
+    # Páginas de listagem chegam já serializadas
+    if isinstance(data, str):
+        return Response(data, media_type="application/json", headers=headers)
+    return JSONResponse(data, headers=headers)
+
+def build_page(rows: list[dict], limit: int) -> dict:
+    # `rows` traz um item a mais que o limite quando existe uma próxima página
+    next_cursor = encode_cursor(rows[limit - 1]["id"]) if len(rows) > limit else None
+    return {"items": rows[:limit], "next_cursor": next_cursor}
+
+def page_validators(page: dict) -> dict:
+    modified = etags.last_modified(*(item.get("updated_at") or item.get("created_at") for item in page["items"]))
+    return etags.validators(etags.page_etag(page), modified)
+
+def asset_validators(version: int, created_at, updated_at) -> dict:
+    return etags.validators(etags.asset_etag(version), etags.last_modified(updated_at or created_at))
+
+@app.get("/assets/", response_model=schemas.AssetPage)
+async def read_assets(
+    request: Request,
+    cursor: str | None = None,
+    limit: int = Query(100, ge=1, le=1000),
+    filters: schemas.AssetFilter = Depends(asset_filters),
+    db: AsyncSession = Depends(get_read_db),
+):
+    try:
+        after_id = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
-@app.get("/assets/", response_model=list[schemas.Asset])
-def read_assets(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    assets = crud.get_assets(db, skip=skip, limit=limit)
-    return assets
+    cached, cache_key = await asset_cache.get_list({"cursor": cursor, "limit": limit, **filters.model_dump(mode="json")})
+    # O cache guarda o corpo já serializado; entradas no formato antigo (a página como dict) são ignoradas
+    if cached is not None and "body" in cached:
+        return conditional_response(request, cached["body"], cached["headers"])
+    token = await asset_cache.read_token(replicas.staleness(db))
+    if "if-none-match" in request.headers or "if-modified-since" in request.headers:
+        # Consulta só id, versão e datas: se o cliente já tem a página atual, as linhas nem são
+        # carregadas nem serializadas
+        versions = await crud.get_asset_rows(
+            db, limit=limit + 1, after_id=after_id, filters=filters, columns=crud.PAGE_VALIDATOR_COLUMNS,
+        )
+        headers = page_validators(build_page(versions, limit))
+        if etags.is_not_modified(request.headers, headers):
+            return Response(status_code=304, headers=headers)
+
+    # Busca um item a mais para saber se existe uma próxima página
+    page = build_page(await crud.get_asset_rows(db, limit=limit + 1, after_id=after_id, filters=filters), limit)
+    headers = page_validators(page)
+    body = schemas.asset_row_page_adapter.dump_json(page).decode()
+    if token is not None:
+        await asset_cache.set_list(cache_key, {"body": body, "headers": headers})
+    return conditional_response(request, body, headers)
+
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+# Deve ser declarado antes de /assets/{asset_id} para não ser capturado como um ID
+@app.get("/assets/export")
+async def export_assets(
+    request: Request,
+    format: ExportFormat = ExportFormat.NDJSON,
+    filters: schemas.AssetFilter = Depends(asset_filters),
+):
+    session_factory = read_router.session_factory(primary=replicas.wants_primary(request.cookies))
+    if format == ExportFormat.CSV:
+        return StreamingResponse(
+            export.stream_csv(filters, session_factory),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="assets.csv"'},
+        )
+    return StreamingResponse(export.stream_ndjson(filters, session_factory), media_type="application/x-ndjson")
+
+# Feed de mudanças para o painel, no lugar do polling de GET /assets/. O EventSource reenvia o
+# último id recebido no cabeçalho Last-Event-ID ao reconectar; o evento `reset` pede ao cliente
+# que recarregue a lista. Sem autenticação, como as demais leituras (EventSource não envia cabeçalhos).
+@app.get("/assets/stream")
+async def stream_asset_changes(last_event_id: str | None = Header(None)):
+    if not feed.FEED_ENABLED:
+        raise HTTPException(status_code=404, detail="Change feed disabled")
+    try:
+        subscription, backlog = await change_feed.open(feed.parse_last_event_id(last_event_id))
+    except feed.FeedUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    return StreamingResponse(
+        change_feed.frames(subscription, backlog),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Mesmo feed por WebSocket (o uvicorn requer o pacote `websockets`): mensagens JSON
+# {"event": "asset" | "reset" | "ping", "data": ...}; o último id recebido vai em ?last_event_id=
+@app.websocket("/assets/stream/ws")
+async def stream_asset_changes_ws(websocket: WebSocket, last_event_id: int | None = None):
+    if not feed.FEED_ENABLED:
+        await websocket.close(code=1008)
+        return
+    try:
+        subscription, backlog = await change_feed.open(last_event_id)
+    except feed.FeedUnavailable:
+        await websocket.close(code=1013) # Try again later
+        return
+    frames = change_feed.frames(subscription, backlog, websocket=True)
+    try:
+        await websocket.accept()
+        async for frame in frames:
+            await websocket.send_text(frame)
+        await websocket.close(code=1013) # Desconectado por lentidão; o cliente deve reconectar
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await frames.aclose()
+
+# Contagens por status × tipo para o dashboard, lidas da tabela de resumo asset_stats
+@app.get("/assets/stats", response_model=schemas.AssetStats)
+async def read_asset_stats(assigned_to: int | None = None, db: AsyncSession = Depends(get_read_db)):
+    counts = [
+        schemas.AssetStatCount(status=status, asset_type=asset_type, count=count)
+        for status, asset_type, count in await crud.get_asset_stats(db, assigned_to=assigned_to)
+    ]
+    by_status = {status: 0 for status in models.AssetStatus}
+    by_type = {asset_type: 0 for asset_type in models.AssetType}
+    for row in counts:
+        by_status[row.status] += row.count
+        by_type[row.asset_type] += row.count
+    return schemas.AssetStats(
+        total=sum(by_status.values()), by_status=by_status, by_type=by_type, counts=counts, assigned_to=assigned_to,
+    )
+
+# Estado dos ativos em um instante passado, reconstruído a partir do histórico
+@app.get("/assets/as-of", response_model=schemas.AssetEventPage)
+async def read_assets_as_of(
+    ts: datetime,
+    cursor: str | None = None,
+    limit: int = Query(100, ge=1, le=1000),
+    status: models.AssetStatus | None = None,
+    assigned_to: int | None = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    try:
+        after_id = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    events = await crud.get_assets_as_of(
+        db, ts=ts, limit=limit + 1, after_id=after_id, status=status, assigned_to=assigned_to,
+    )
+    next_cursor = encode_cursor(events[limit - 1].asset_id) if len(events) > limit else None
+    return schemas.AssetEventPage(items=events[:limit], next_cursor=next_cursor)
+
+@app.get("/assets/{asset_id}/history", response_model=schemas.AssetEventPage)
+async def read_asset_history(
+    asset_id: int,
+    cursor: str | None = None,
+    limit: int = Query(100, ge=1, le=1000),
+    changed_from: datetime | None = None,
+    changed_to: datetime | None = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    try:
+        before_id = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    events = await crud.get_asset_history(
+        db, asset_id, limit=limit + 1, before_id=before_id, changed_from=changed_from, changed_to=changed_to,
+    )
+    next_cursor = encode_cursor(events[limit - 1].id) if len(events) > limit else None
+    return schemas.AssetEventPage(items=events[:limit], next_cursor=next_cursor)
+
+def precondition_failed(error: crud.StaleVersionError) -> HTTPException:
+    headers = {"ETag": etags.asset_etag(error.current_version)} if error.current_version is not None else None
+    return HTTPException(status_code=412, detail="Asset was modified", headers=headers)
 
 @app.get("/assets/{asset_id}", response_model=schemas.Asset)
-def read_asset_by_id(asset_id: int, db: Session = Depends(get_db)):
-    db_asset = crud.get_asset(db, asset_id=asset_id)
+async def read_asset_by_id(asset_id: int, request: Request, db: AsyncSession = Depends(get_read_db)):
+    cached = await asset_cache.get_asset(asset_id)
+    # Entradas gravadas antes da coluna version não servem para validação
+    if cached is not None and "version" in cached:
+        headers = asset_validators(cached["version"], cached["created_at"], cached["updated_at"])
+        return conditional_response(request, cached, headers)
+
+    token = await asset_cache.read_token(replicas.staleness(db))
+    if "if-none-match" in request.headers or "if-modified-since" in request.headers:
+        # Consulta só a versão: se o cliente já tem a atual, a linha nem é carregada
+        current = await crud.get_asset_version(db, asset_id)
+        if current is None:
+            raise HTTPException(status_code=404, detail="Asset not found")
+        headers = asset_validators(current.version, current.created_at, current.updated_at)
+        if etags.is_not_modified(request.headers, headers):
+            return Response(status_code=304, headers=headers)
+
+    db_asset = await crud.get_asset(db, asset_id=asset_id)
     if db_asset is None:
         raise HTTPException(status_code=404, detail="Asset not found")
-    return db_asset
+    data = schemas.Asset.model_validate(db_asset).model_dump(mode="json")
+    await asset_cache.set_asset(asset_id, data, token)
+    return conditional_response(request, data, asset_validators(db_asset.version, db_asset.created_at, db_asset.updated_at))
 
+# PUT e DELETE aceitam If-Match com o ETag lido no GET; versão diferente resulta em 412
 @app.put("/assets/{asset_id}", response_model=schemas.Asset)
-def update_existing_asset(
+async def update_existing_asset(
     asset_id: int,
     asset_update: schemas.AssetCreate,
-    db: Session = Depends(get_db),
+    response: Response,
+    if_match: str | None = Header(None),
+    db: AsyncSession = Depends(get_db),
     current_user: security.TokenData = Depends(security.get_current_user),
 ):
-    db_asset = crud.update_asset(db, asset_id=asset_id, asset_update=asset_update)
+    try:
+        db_asset = await crud.update_asset(
+            db, asset_id=asset_id, asset_update=asset_update, expected_versions=etags.parse_if_match(if_match),
+        )
+    except crud.StaleVersionError as e:
+        raise precondition_failed(e)
     if db_asset is None:
         raise HTTPException(status_code=404, detail="Asset not found")
+    response.headers.update(asset_validators(db_asset.version, db_asset.created_at, db_asset.updated_at))
     return db_asset
 
 @app.delete("/assets/{asset_id}", response_model=schemas.Asset)
-def delete_existing_asset(
+async def delete_existing_asset(
     asset_id: int,
-    db: Session = Depends(get_db),
+    if_match: str | None = Header(None),
+    db: AsyncSession = Depends(get_db),
     current_user: security.TokenData = Depends(security.get_current_user),
 ):
-    db_asset = crud.delete_asset(db, asset_id=asset_id)
+    try:
+        db_asset = await crud.delete_asset(db, asset_id=asset_id, expected_versions=etags.parse_if_match(if_match))
+    except crud.StaleVersionError as e:
+        raise precondition_failed(e)
     if db_asset is None:
         raise HTTPException(status_code=404, detail="Asset not found")
     return db_asset
 
+# Contadores de hit/miss do cache de leitura
+@app.get("/cache/stats")
+def read_cache_stats():
+    return asset_cache.stats()
+
+# Vagas em uso, filas e recusas de cada orçamento de admissão
+@app.get("/admission/stats")
+def read_admission_stats():
+    return admission.scheduler.stats()
+
+# Métricas no formato do Prometheus
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+# Liveness: só indica que o processo responde; não consulta o banco, para que uma queda dele
+# não faça o orquestrador reiniciar todas as réplicas
+@app.get("/health/live", include_in_schema=False)
+def health_live():
+    return {"status": "ok"}
+
+# Readiness: o banco responde. A inicialização não abre conexões; esta é a primeira a fazê-lo
+@app.get("/health/ready", include_in_schema=False)
+async def health_ready():
+    try:
+        await asyncio.wait_for(database.ping(), database.DB_HEALTH_TIMEOUT)
+    except Exception as e:
+        return JSONResponse({"status": "unavailable", "detail": str(e) or type(e).__name__}, status_code=503)
+    # Réplicas defasadas não tornam o serviço indisponível: as leituras voltam ao primário
+    if read_router.enabled:
+        return {"status": "ok", "replicas": read_router.status()}
+    return {"status": "ok"}
+
 # Endpoint raiz para verificar se a API está no ar.
 @app.get("/")
 def read_root():
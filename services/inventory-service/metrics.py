@@ -0,0 +1,421 @@
+"""
+Métricas no formato texto do Prometheus e tempos por requisição (Server-Timing).
+
+Implementação mínima de Counter/Gauge/Histogram para não adicionar dependências ao serviço.
+As métricas são locais ao processo: com vários workers, cada um expõe as suas e o Prometheus
+agrega por instância.
+"""
+import contextvars
+import logging
+import os
+import time
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURAÇÕES DAS MÉTRICAS ---
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Adiciona o cabeçalho Server-Timing (tempo total, banco e espera do pool) às respostas
+TIMING_HEADERS_ENABLED = os.getenv("TIMING_HEADERS_ENABLED", "false").lower() in ("1", "true", "yes")
+# Consultas mais lentas que isto (ms) são registradas no log; 0 desativa
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "0"))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: tuple, **extra) -> dict:
+        return {**dict(zip(self.labelnames, key)), **extra}
+
+    def samples(self) -> Iterable[tuple[str, dict, float]]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+        if not self.labelnames:
+            self._values[()] = 0
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        for key, value in self._values.items():
+            yield self.name, self._labels(key), value
+
+
+class Gauge(_Metric):
+    """
+    Valor instantâneo. Com `collect`, é recalculado a cada coleta (ex.: estado do pool).
+    """
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        collect: Optional[Callable[[], dict[tuple, float]]] = None,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+        self._collect = collect
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        values = self._values
+        if self._collect is not None:
+            try:
+                values = self._collect()
+            except Exception as e:
+                logger.warning(f"Falha ao coletar a métrica {self.name}: {e}")
+                values = {}
+        for key, value in values.items():
+            yield self.name, self._labels(key), value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # Por conjunto de labels: (contagens por bucket, soma, total)
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[0][i] += 1
+                break
+        entry[1] += value
+        entry[2] += 1
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    def samples(self):
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", self._labels(key, le=_format_value(bound)), cumulative
+            yield f"{self.name}_sum", self._labels(key), total
+            yield f"{self.name}_count", self._labels(key), count
+
+
+class WindowStats:
+    """
+    Média e máximo das observações desde a última leitura (`take`), para controles adaptativos
+    que precisam do valor recente e não do acumulado desde o início do processo.
+    """
+
+    __slots__ = ("count", "total", "maximum")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        if value > self.maximum:
+            self.maximum = value
+
+    def take(self) -> tuple[int, float, float]:
+        """
+        Retorna (observações, média, máximo) da janela e começa uma nova.
+        """
+        count, total, maximum = self.count, self.total, self.maximum
+        self.count, self.total, self.maximum = 0, 0.0, 0.0
+        return count, (total / count if count else 0.0), maximum
+
+
+REGISTRY: list[_Metric] = []
+
+
+def render() -> str:
+    """
+    Todas as métricas registradas no formato de exposição texto do Prometheus.
+    """
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+# --- HTTP ---
+http_requests_total = Counter(
+    "inventory_http_requests_total", "Requisições HTTP atendidas.", ("method", "route", "status")
+)
+http_request_duration_seconds = Histogram(
+    "inventory_http_request_duration_seconds",
+    "Tempo até o início da resposta, por rota.",
+    ("method", "route"),
+)
+http_requests_in_progress = Gauge(
+    "inventory_http_requests_in_progress", "Requisições HTTP em andamento.", ("method",)
+)
+
+# --- BANCO DE DADOS ---
+db_query_duration_seconds = Histogram(
+    "inventory_db_query_duration_seconds",
+    "Duração das consultas SQL, pela primeira palavra do comando.",
+    ("operation",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+db_pool_wait_seconds = Histogram(
+    "inventory_db_pool_wait_seconds",
+    "Tempo de espera para obter uma conexão do pool.",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0, 30.0),
+)
+db_pool_errors_total = Counter(
+    "inventory_db_pool_errors_total", "Falhas ao obter conexão do pool (timeout ou erro de conexão)."
+)
+# Espera pelo pool do primário desde a última leitura, usada pelo ajuste do prefetch do consumidor
+# (admission.py); as leituras nas réplicas não disputam esse pool e não entram aqui
+pool_wait_window = WindowStats()
+# Engines instrumentadas, por nome ("primary", "replica0", ...); lidas a cada coleta do gauge abaixo
+_instrumented_engines: dict = {}
+
+
+def _pool_states() -> dict[tuple, float]:
+    states = {}
+    for name, engine in _instrumented_engines.items():
+        # Lido a cada coleta: engine.dispose() troca o pool da engine
+        pool = engine.pool
+        states[(name, "checked_out")] = pool.checkedout()
+        if hasattr(pool, "size"):
+            states[(name, "size")] = pool.size()
+            states[(name, "overflow")] = max(0, pool.overflow())
+            states[(name, "idle")] = pool.checkedin()
+    return states
+
+
+db_pool_connections = Gauge(
+    "inventory_db_pool_connections", "Conexões de cada pool (primary ou réplica) por estado.", ("pool", "state"),
+    collect=_pool_states,
+)
+db_reads_total = Counter(
+    "inventory_db_reads_total", "Sessões de leitura por destino (primary ou réplica), com réplicas configuradas.", ("target",)
+)
+db_replica_lag_seconds = Gauge(
+    "inventory_db_replica_lag_seconds", "Atraso de replicação medido na última verificação de cada réplica.", ("replica",)
+)
+
+# --- CONSUMIDOR DE CHECKOUT ---
+consumer_messages_total = Counter(
+    "inventory_consumer_messages_total",
+    "Mensagens de checkout recebidas, por resultado (applied, duplicate, dead_lettered, retried, requeued).",
+    ("outcome",),
+)
+consumer_batch_size = Histogram(
+    "inventory_consumer_batch_size",
+    "Mensagens por lote processado.",
+    buckets=(1, 5, 10, 25, 50, 100, 200, 500, 1000),
+)
+consumer_batch_duration_seconds = Histogram(
+    "inventory_consumer_batch_duration_seconds", "Tempo de processamento de cada lote, incluindo o ack."
+)
+consumer_message_lag_seconds = Histogram(
+    "inventory_consumer_message_lag_seconds",
+    "Atraso entre a publicação (timestamp AMQP) e o processamento da mensagem.",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+consumer_failures_total = Counter(
+    "inventory_consumer_failures_total", "Falhas no processamento de lotes, por etapa.", ("stage",)
+)
+
+consumer_prefetch_count = Gauge(
+    "inventory_consumer_prefetch_count", "Limite de prefetch em vigor, reduzido quando a espera pelo pool sobe."
+)
+
+# --- CONTROLE DE ADMISSÃO ---
+admission_active = Gauge("inventory_admission_active", "Operações em andamento por orçamento.", ("budget",))
+admission_queue_depth = Gauge(
+    "inventory_admission_queue_depth", "Operações aguardando vaga por orçamento.", ("budget",)
+)
+admission_rejected_total = Counter(
+    "inventory_admission_rejected_total", "Requisições recusadas com 429, por orçamento e motivo (queue_full, timeout).",
+    ("budget", "reason"),
+)
+
+# --- FEED DE MUDANÇAS ---
+feed_subscribers = Gauge("inventory_feed_subscribers", "Conexões abertas no feed de mudanças (SSE e WebSocket).")
+feed_evictions_total = Counter(
+    "inventory_feed_evictions_total", "Clientes do feed desconectados por não acompanharem os eventos."
+)
+
+
+# --- TEMPOS POR REQUISIÇÃO ---
+class RequestTiming:
+    """
+    Acumula o tempo gasto no banco durante uma requisição (lido pelo cabeçalho Server-Timing).
+    """
+
+    __slots__ = ("db_seconds", "db_queries", "pool_wait_seconds")
+
+    def __init__(self):
+        self.db_seconds = 0.0
+        self.db_queries = 0
+        self.pool_wait_seconds = 0.0
+
+    def server_timing(self, total_seconds: float) -> str:
+        return (
+            f"app;dur={total_seconds * 1000:.1f}, "
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.db_queries} queries", '
+            f"pool;dur={self.pool_wait_seconds * 1000:.1f}"
+        )
+
+
+# Objeto mutável: os eventos do SQLAlchemy rodam em greenlets que herdam o contexto da requisição
+current_timing: contextvars.ContextVar[Optional[RequestTiming]] = contextvars.ContextVar("current_timing", default=None)
+
+
+def _observe_pool_wait(elapsed: float, primary: bool = True) -> None:
+    db_pool_wait_seconds.observe(elapsed)
+    if primary:
+        pool_wait_window.observe(elapsed)
+    timing = current_timing.get()
+    if timing is not None:
+        timing.pool_wait_seconds += elapsed
+
+
+class TimedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Pool das engines assíncronas que mede a espera por uma conexão em `connect()`, o método
+    público pelo qual a engine obtém cada conexão (não há evento "antes do checkout"). Inclui a
+    abertura de conexões novas e o pre-ping.
+
+    É escolhido por `poolclass` na criação das engines (ver `pool_class`); `recreate()`, usado
+    por engine.dispose(), cria um pool da mesma classe e a medição continua.
+    """
+
+    primary = True # Alimenta pool_wait_window (ver `TimedReplicaPool`)
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except Exception:
+            db_pool_errors_total.inc()
+            raise
+        finally:
+            _observe_pool_wait(time.perf_counter() - started, self.primary)
+
+
+class TimedReplicaPool(TimedAsyncAdaptedQueuePool):
+    """
+    Pool das réplicas: entra no histograma de espera, mas não no ajuste do prefetch do consumidor.
+    """
+
+    primary = False
+
+
+# O SQLAlchemy nomeia o logger do pool pelo módulo e nome da classe ("metrics.Timed..."), fora
+# da hierarquia "sqlalchemy", que fica em WARNING: sem isto, dispose/recreate iriam para o log em INFO
+_pool_logger = logging.getLogger(f"{__name__}.{TimedAsyncAdaptedQueuePool.__name__}")
+if _pool_logger.level == logging.NOTSET:
+    _pool_logger.setLevel(logging.WARNING)
+
+
+def pool_class(replica: bool = False):
+    """
+    Classe de pool das engines assíncronas: com as métricas desligadas, o pool padrão.
+    """
+    if not METRICS_ENABLED:
+        return AsyncAdaptedQueuePool
+    return TimedReplicaPool if replica else TimedAsyncAdaptedQueuePool
+
+
+def instrument_engine(engine, name: str = "primary") -> None:
+    """
+    Registra eventos na engine (síncrona, ou `async_engine.sync_engine`) para medir a duração
+    das consultas e inclui seu pool, identificado por `name`, no gauge de conexões. A espera
+    por conexões é medida pelo próprio pool (ver `TimedAsyncAdaptedQueuePool`).
+    """
+    if name in _instrumented_engines:
+        return
+    _instrumented_engines[name] = engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_started"].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        db_query_duration_seconds.observe(elapsed, operation=operation)
+        timing = current_timing.get()
+        if timing is not None:
+            timing.db_seconds += elapsed
+            timing.db_queries += 1
+        if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+            logger.warning(f"Consulta lenta ({elapsed * 1000:.1f}ms): {statement[:500]}")
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(context):
+        # A consulta falhou: descarta o início registrado em before_cursor_execute
+        if context.connection is not None:
+            started = context.connection.info.get("query_started")
+            if started:
+                started.pop()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Enum as SQLAlchemyEnum
+from sqlalchemy import BigInteger, Column, Integer, JSON, String, DateTime, Enum as SQLAlchemyEnum, Index
 from sqlalchemy.sql import func
 import enum
 from database import Base
@@ -27,5 +27,81 @@ class Asset(Base):
     model = Column(String, nullable=False)
     serial_number = Column(String, unique=True, index=True, nullable=False)
     status = Column(SQLAlchemyEnum(AssetStatus), nullable=False, default=AssetStatus.IN_STOCK)
+    assigned_to = Column(Integer, nullable=True) # ID do funcionário (directory-service) que está com o ativo
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
\ No newline at end of file
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Incrementada a cada escrita; exposta como ETag para controle de concorrência otimista (If-Match)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    # Índices alinhados às consultas de GET /assets/ (filtros + paginação por id).
+    # Os índices trigram exigem a extensão pg_trgm (criada na migração correspondente).
+    __table_args__ = (
+        Index("ix_assets_status_id", "status", "id"),
+        Index("ix_assets_asset_type_id", "asset_type", "id"),
+        Index("ix_assets_status_asset_type_id", "status", "asset_type", "id"),
+        Index("ix_assets_assigned_to_id", "assigned_to", "id"),
+        Index("ix_assets_created_at", "created_at"),
+        Index("ix_assets_updated_at", "updated_at"),
+        Index("ix_assets_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+        Index("ix_assets_model_trgm", "model", postgresql_using="gin", postgresql_ops={"model": "gin_trgm_ops"}),
+    )
+
+
+class OutboxEvent(Base):
+    # Eventos gravados na mesma transação das mutações de 'assets' e publicados depois pelo relay (outbox.py)
+    __tablename__ = "outbox_events"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    aggregate_id = Column(Integer, nullable=False) # ID do ativo; a ordem é preservada por ativo
+    event_type = Column(String, nullable=False) # Também usado como routing key (ex.: asset.created)
+    payload = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    published_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # Índice parcial: o relay só percorre os eventos ainda não publicados
+        Index("ix_outbox_events_unpublished", "id", postgresql_where=published_at.is_(None), sqlite_where=published_at.is_(None)),
+    )
+
+
+class ProcessedEvent(Base):
+    # Ledger de mensagens já aplicadas pelo consumidor de checkout; reentregas são ignoradas
+    __tablename__ = "processed_events"
+
+    message_id = Column(String, primary_key=True)
+    processed_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+
+class AssetEvent(Base):
+    # Histórico append-only dos ativos, gravado na mesma transação de cada mudança.
+    # No PostgreSQL a tabela é particionada por mês (RANGE em changed_at) pela migração, com chave
+    # primária (id, changed_at); as partições antigas são desanexadas/removidas por history.py.
+    __tablename__ = "asset_events"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    asset_id = Column(Integer, nullable=False) # Sem FK: o histórico sobrevive à remoção do ativo
+    event_type = Column(String, nullable=False) # created | updated | status_changed | deleted
+    status = Column(SQLAlchemyEnum(AssetStatus), nullable=False)
+    assigned_to = Column(Integer, nullable=True)
+    changes = Column(JSON, nullable=True) # Em created, a linha gravada; em updated, só os campos que mudaram
+    changed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        # GET /assets/{id}/history e o "último evento até ts" de cada ativo em /assets/as-of
+        Index("ix_asset_events_asset_id_id", "asset_id", "id"),
+        # Percurso de /assets/as-of em ordem de ativo, a partir do evento de criação
+        Index(
+            "ix_asset_events_created_asset_id", "asset_id",
+            postgresql_where=event_type == "created", sqlite_where=event_type == "created",
+        ),
+    )
+
+
+class AssetStat(Base):
+    # Contagem de ativos por status × tipo, mantida incrementalmente pelas mutações em crud.py
+    # (nenhuma requisição faz GROUP BY em 'assets'); aggregates.py corrige eventuais divergências
+    __tablename__ = "asset_stats"
+
+    status = Column(SQLAlchemyEnum(AssetStatus), primary_key=True)
+    asset_type = Column(SQLAlchemyEnum(AssetType), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,24 @@
+import base64
+import json
+
+# Cursores opacos para a paginação por keyset: o cliente apenas devolve o valor recebido
+# em `next_cursor`, sem depender do formato interno.
+
+
+def encode_cursor(last_id: int) -> str:
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    Retorna o último ID visto. Lança ValueError se o cursor for inválido.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded))["id"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(last_id, int):
+        raise ValueError("Invalid cursor")
+    return last_id
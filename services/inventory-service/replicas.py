@@ -0,0 +1,170 @@
+"""
+Roteamento das leituras para réplicas do PostgreSQL (DATABASE_REPLICA_URLS).
+
+Os GETs recebem sessões de uma réplica saudável, em rodízio; escritas, consumidor de checkout,
+relay da outbox e tarefas de manutenção continuam no primário. Uma tarefa mede periodicamente o
+atraso de replicação de cada réplica: acima de REPLICA_MAX_LAG_SECONDS, ou se a verificação
+falha, a réplica sai do rodízio e as leituras voltam ao primário até ela se recuperar.
+
+Read-your-writes: toda escrita bem-sucedida responde com um cookie de READ_YOUR_WRITES_SECONDS;
+enquanto ele existir, as leituras daquele cliente vão ao primário e enxergam o que acabou de
+ser gravado.
+"""
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from starlette.datastructures import MutableHeaders
+
+import metrics
+from database import DB_HEALTH_TIMEOUT, AsyncSessionLocal, replica_engines
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURAÇÕES DAS RÉPLICAS ---
+# Atraso de replicação (segundos) acima do qual a réplica deixa de receber leituras
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_CHECK_INTERVAL_SECONDS = float(os.getenv("REPLICA_CHECK_INTERVAL_SECONDS", "2"))
+# Janela após uma escrita em que as leituras do mesmo cliente vão ao primário (0 desativa)
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+READ_YOUR_WRITES_COOKIE = "inventory_rw"
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Zero quando a réplica já aplicou tudo o que recebeu (primário ocioso não conta como atraso);
+# senão, o tempo desde a última transação aplicada. Fora de recuperação, é o próprio primário
+LAG_QUERY = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+async def measure_lag(connection) -> Optional[float]:
+    """
+    Atraso de replicação em segundos, ou None se não puder ser determinado.
+    """
+    if connection.dialect.name != "postgresql":
+        return 0.0 # SQLite (benchmarks): sem replicação
+    lag = await connection.scalar(LAG_QUERY)
+    return None if lag is None else float(lag)
+
+
+class Replica:
+    def __init__(self, name: str, engine):
+        self.name = name
+        self.engine = engine
+        # `info` identifica a sessão como de réplica (ver `staleness`)
+        self.session_factory = async_sessionmaker(
+            engine, class_=AsyncSession, autoflush=False, expire_on_commit=False, info={"replica": name}
+        )
+        self.lag: Optional[float] = None
+        self.healthy = False # Só recebe leituras depois da primeira verificação
+
+
+class ReadRouter:
+    """
+    Escolhe a fábrica de sessões de cada leitura. `lag_probe` mede o atraso numa conexão da
+    réplica e pode ser substituído (ex.: para simular atraso em testes e benchmarks).
+    """
+
+    def __init__(
+        self,
+        replicas: list[Replica],
+        primary_factory=AsyncSessionLocal,
+        max_lag: float = REPLICA_MAX_LAG_SECONDS,
+        lag_probe: Callable[..., Awaitable[Optional[float]]] = measure_lag,
+    ):
+        self.replicas = replicas
+        self.primary_factory = primary_factory
+        self.max_lag = max_lag
+        self.lag_probe = lag_probe
+        self._next = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def session_factory(self, primary: bool = False):
+        if not primary:
+            healthy = [replica for replica in self.replicas if replica.healthy]
+            if healthy:
+                self._next = (self._next + 1) % len(healthy)
+                replica = healthy[self._next]
+                metrics.db_reads_total.inc(target=replica.name)
+                return replica.session_factory
+        if self.enabled:
+            metrics.db_reads_total.inc(target="primary")
+        return self.primary_factory
+
+    def session(self, primary: bool = False) -> AsyncSession:
+        return self.session_factory(primary)()
+
+    async def _check(self, replica: Replica) -> None:
+        try:
+            async with replica.engine.connect() as connection:
+                lag = await asyncio.wait_for(self.lag_probe(connection), DB_HEALTH_TIMEOUT)
+            error = None if lag is not None else "atraso desconhecido"
+        except Exception as e:
+            lag, error = None, str(e) or type(e).__name__
+        healthy = lag is not None and lag <= self.max_lag
+        if healthy != replica.healthy:
+            if healthy:
+                logger.info(f"Réplica {replica.name} de volta ao rodízio (atraso {lag:.2f}s).")
+            else:
+                reason = error or f"atraso {lag:.2f}s > {self.max_lag}s"
+                logger.warning(f"Réplica {replica.name} fora do rodízio ({reason}); leituras no primário.")
+        replica.lag = lag
+        replica.healthy = healthy
+        if lag is not None:
+            metrics.db_replica_lag_seconds.set(lag, replica=replica.name)
+
+    async def check_once(self) -> None:
+        await asyncio.gather(*(self._check(replica) for replica in self.replicas))
+
+    async def run(self, interval: float = REPLICA_CHECK_INTERVAL_SECONDS) -> None:
+        while True:
+            await self.check_once()
+            await asyncio.sleep(interval)
+
+    def status(self) -> list[dict]:
+        return [{"name": replica.name, "healthy": replica.healthy, "lag_seconds": replica.lag} for replica in self.replicas]
+
+
+def staleness(db: AsyncSession) -> float:
+    """
+    Quanto os dados lidos por esta sessão podem estar atrasados em relação ao primário.
+    """
+    return REPLICA_MAX_LAG_SECONDS if "replica" in db.info else 0.0
+
+
+def wants_primary(cookies) -> bool:
+    return READ_YOUR_WRITES_COOKIE in cookies
+
+
+class ReadYourWritesMiddleware:
+    """
+    Marca o cliente que acabou de escrever (métodos não seguros com resposta 2xx/3xx) com o
+    cookie de read-your-writes.
+    """
+
+    def __init__(self, app, window_seconds: int = READ_YOUR_WRITES_SECONDS):
+        self.app = app
+        self.cookie = f"{READ_YOUR_WRITES_COOKIE}=1; Max-Age={window_seconds}; Path=/; HttpOnly; SameSite=Lax"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and 200 <= message["status"] < 400:
+                MutableHeaders(scope=message).append("set-cookie", self.cookie)
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+
+read_router = ReadRouter([Replica(f"replica{index}", engine) for index, engine in enumerate(replica_engines)])
@@ -1,5 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, TypeAdapter
+from typing_extensions import TypedDict # O pydantic exige a versão do typing_extensions no Python < 3.12
 from datetime import datetime
+from enum import Enum
 from models import AssetType, AssetStatus
 
 class AssetBase(BaseModel):
@@ -14,8 +16,114 @@ class AssetCreate(AssetBase):
 
 class Asset(AssetBase):
     id: int
+    assigned_to: int | None = None
     created_at: datetime
     updated_at: datetime | None = None
+    version: int
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class AssetFilter(BaseModel):
+    status: AssetStatus | None = None
+    asset_type: AssetType | None = None
+    assigned_to: int | None = None
+    created_from: datetime | None = None
+    created_to: datetime | None = None
+    updated_from: datetime | None = None
+    updated_to: datetime | None = None
+    # Busca por trecho (prefixo ou substring) em name e model, servida pelos índices trigram
+    q: str | None = None
+
+class AssetPage(BaseModel):
+    items: list[Asset]
+    # Cursor opaco para a próxima página; None quando não há mais ativos
+    next_cursor: str | None = None
+
+# --- SERIALIZAÇÃO RÁPIDA DAS LISTAGENS ---
+# Listagem e exportação leem só as colunas (sem objetos ORM) e serializam os dicts direto para
+# JSON com TypeAdapters compilados uma única vez, sem instanciar um Asset por linha.
+# AssetRow acompanha os campos de Asset; AssetRowPage tem o mesmo formato de AssetPage.
+AssetRow = TypedDict("AssetRow", {name: field.annotation for name, field in Asset.model_fields.items()})
+
+class AssetRowPage(TypedDict):
+    items: list[AssetRow]
+    next_cursor: str | None
+
+asset_row_adapter = TypeAdapter(AssetRow)
+asset_row_page_adapter = TypeAdapter(AssetRowPage)
+
+# --- HISTÓRICO ---
+
+class AssetEventType(str, Enum):
+    CREATED = "created"
+    UPDATED = "updated"
+    STATUS_CHANGED = "status_changed"
+    DELETED = "deleted"
+
+class AssetEvent(BaseModel):
+    id: int
+    asset_id: int
+    event_type: AssetEventType
+    status: AssetStatus
+    assigned_to: int | None = None
+    changes: dict | None = None # created: os campos gravados; updated: só os que mudaram de valor
+    changed_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class AssetEventPage(BaseModel):
+    items: list[AssetEvent]
+    next_cursor: str | None = None
+
+# --- ESTATÍSTICAS ---
+
+class AssetStatCount(BaseModel):
+    status: AssetStatus
+    asset_type: AssetType
+    count: int
+
+class AssetStats(BaseModel):
+    total: int
+    by_status: dict[AssetStatus, int]
+    by_type: dict[AssetType, int]
+    counts: list[AssetStatCount] # Status × tipo; combinações sem ativos são omitidas
+    assigned_to: int | None = None # Preenchido quando as contagens são de um único funcionário
+
+# --- OPERAÇÕES EM MASSA ---
+
+class AssetUpdate(BaseModel):
+    # Atualização parcial: apenas os campos enviados são alterados
+    name: str | None = None
+    asset_type: AssetType | None = None
+    model: str | None = None
+    serial_number: str | None = None
+    status: AssetStatus | None = None
+
+class AssetBulkUpdate(AssetUpdate):
+    id: int
+
+class AssetBulkDelete(BaseModel):
+    ids: list[int] = Field(min_length=1)
+
+class BulkRowStatus(str, Enum):
+    CREATED = "created"
+    UPDATED = "updated"
+    DELETED = "deleted"
+    DUPLICATE = "duplicate"
+    NOT_FOUND = "not_found"
+    INVALID = "invalid"
+    ERROR = "error"
+
+class BulkRowResult(BaseModel):
+    index: int # Posição da linha no payload (0 = primeira linha de dados)
+    status: BulkRowStatus
+    id: int | None = None
+    serial_number: str | None = None
+    detail: str | None = None
+
+class BulkResult(BaseModel):
+    succeeded: int
+    failed: int
+    results: list[BulkRowResult]
@@ -1,50 +1,121 @@
 # services/inventory-service/security.py
+import hashlib
+import logging
+import time
+from collections import OrderedDict
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from pydantic import BaseModel
 import os # Importar para ler variáveis de ambiente
 
+logger = logging.getLogger(__name__)
+# Nível de log deste módulo (ex.: DEBUG para diagnosticar tokens rejeitados)
+logger.setLevel(os.getenv("SECURITY_LOG_LEVEL", "WARNING").upper())
+
 # --- CONFIGURAÇÕES DE SEGURANÇA ---
 # Tente ler do .env, se não existir, use o valor padrão
 SECRET_KEY = os.getenv("SECRET_KEY", "SEU_SEGREDO_SUPER_SECRETO") # Lê do .env ou usa valor fixo
 ALGORITHM = os.getenv("ALGORITHM", "HS256") # Lê do .env ou usa valor padrão
 
+# Cache de tokens já verificados: 0 desativa. Entradas valem até o `exp` do token,
+# limitadas a TOKEN_CACHE_TTL_SECONDS (também aplicado a tokens sem `exp`).
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL_SECONDS = float(os.getenv("TOKEN_CACHE_TTL_SECONDS", "300"))
+
 oauth2_scheme = HTTPBearer()
 
 # --- MODELO DE DADOS PARA O TOKEN ---
 class TokenData(BaseModel):
     email: str | None = None
 
-# --- FUNÇÃO PRINCIPAL DE VALIDAÇÃO ---
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme)):
+# --- CACHE DE TOKENS VERIFICADOS ---
+class VerifiedTokenCache:
     """
-    Decodifica o token JWT, valida e extrai os dados do usuário.
+    LRU limitado de tokens cuja assinatura já foi verificada, indexado pelo SHA-256 do token
+    (o token em si não fica em memória). Só tokens válidos são armazenados.
     """
-    # Extrai o token da credencial
-    token = credentials.credentials
 
-    credentials_exception = HTTPException(
+    def __init__(self, maxsize: int = TOKEN_CACHE_SIZE, ttl: float = TOKEN_CACHE_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, TokenData]] = OrderedDict()
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, key: str) -> TokenData | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, token_data = entry
+        # time.time(), e não monotonic, porque `exp` é um timestamp Unix
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return token_data
+
+    def put(self, key: str, token_data: TokenData, exp: float | None) -> None:
+        if self.maxsize <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+        self._entries[key] = (expires_at, token_data)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+token_cache = VerifiedTokenCache()
+
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def verify_token(token: str) -> TokenData:
+    """
+    Decodifica e valida o token JWT, consultando antes o cache de tokens verificados.
+    """
+    key = token_cache.key(token)
+    cached = token_cache.get(key)
+    if cached is not None:
+        return cached
+
     try:
-        # Decodifica o token
+        # Decodifica o token (assinatura e `exp` são verificados pelo jose)
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        print(f"[DEBUG] Payload decodificado: {payload}") # <-- Linha de debug temporária
+    except JWTError as e:
+        # Argumentos no estilo %: a mensagem só é formatada se o nível DEBUG estiver ativo
+        logger.debug("JWT rejeitado: %s", e)
+        raise _credentials_exception()
 
-        # Tenta obter o email do payload
-        email: str = payload.get("email")
-        print(f"[DEBUG] Email extraído: {email}") # <-- Linha de debug temporária
+    # Tenta obter o email do payload
+    email = payload.get("email")
+    if email is None:
+        logger.debug("JWT sem o campo 'email' (claims: %s)", sorted(payload))
+        raise _credentials_exception()
+
+    token_data = TokenData(email=email)
+    token_cache.put(key, token_data, payload.get("exp"))
+    return token_data
 
-        if email is None:
-            print("[DEBUG] Campo 'email' não encontrado no payload ou é None") # <-- Linha de debug temporária
-            raise credentials_exception
-        token_data = TokenData(email=email)
-    except JWTError as e:
-        print(f"[DEBUG] Erro ao decodificar JWT: {e}") # <-- Linha de debug temporária
-        raise credentials_exception
 
-    return token_data
\ No newline at end of file
+# --- FUNÇÃO PRINCIPAL DE VALIDAÇÃO ---
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme)):
+    """
+    Decodifica o token JWT, valida e extrai os dados do usuário.
+    """
+    return verify_token(credentials.credentials)
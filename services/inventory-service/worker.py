@@ -0,0 +1,187 @@
+"""
+Worker do consumidor de checkout, independente da API.
+
+Roda N processos, cada um com CHECKOUT_CONSUMER_CONCURRENCY consumidores (um canal cada).
+Todos declaram a mesma topologia (exchange, binding, retries e DLQ) e dividem a fila.
+No SIGTERM (ou SIGINT), cada processo cancela o consumo, termina e confirma os lotes já
+recebidos e sai. O processo principal repassa o sinal e espera a drenagem, encerrando à força
+quem passar do limite; o que não foi confirmado volta para a fila. Processos que terminam
+inesperadamente são reiniciados.
+
+O cache precisa ser compartilhado (CACHE_BACKEND=redis ou none): as escritas do worker invalidam
+o cache lido pela API. Cada processo expõe as próprias métricas em GET /metrics, na porta
+CHECKOUT_WORKER_METRICS_PORT + índice do processo. O primeiro processo também hospeda as tarefas
+de manutenção (jobs.py), que rodam em um único processo do cluster; com
+BACKGROUND_JOBS_EMBEDDED=false, a API deixa de disputá-las.
+
+Uso, a partir de services/inventory-service:
+    python worker.py --processes 4 --concurrency 2
+    CHECKOUT_CONSUMER_EMBEDDED=false BACKGROUND_JOBS_EMBEDDED=false uvicorn main:app    # API só web
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+import cache
+import consumer
+import jobs
+import metrics
+from database import async_engine
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURAÇÕES DO WORKER ---
+WORKER_PROCESSES = int(os.getenv("CHECKOUT_WORKER_PROCESSES", "1"))
+# Espera antes de reiniciar um processo que terminou sem ter recebido sinal de parada
+WORKER_RESTART_DELAY_SECONDS = float(os.getenv("CHECKOUT_WORKER_RESTART_DELAY_SECONDS", "5"))
+# Porta de GET /metrics do primeiro processo (os demais usam as seguintes); 0 desativa
+WORKER_METRICS_PORT = int(os.getenv("CHECKOUT_WORKER_METRICS_PORT", "9100"))
+WORKER_METRICS_HOST = os.getenv("CHECKOUT_WORKER_METRICS_HOST", "0.0.0.0")
+
+
+async def _serve_metrics(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    # HTTP mínimo para o scrape do Prometheus: só GET /metrics, uma requisição por conexão
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass # Cabeçalhos ignorados
+        parts = request_line.split()
+        if len(parts) >= 2 and parts[0] == b"GET" and parts[1].split(b"?")[0] == b"/metrics":
+            status, content_type, body = "200 OK", metrics.CONTENT_TYPE, metrics.render().encode()
+        else:
+            status, content_type, body = "404 Not Found", "text/plain; charset=utf-8", b"Not Found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+def check_shared_cache() -> None:
+    if not cache.shared_between_processes():
+        raise RuntimeError(
+            f"CACHE_BACKEND={cache.CACHE_BACKEND}: as invalidações do worker não chegariam ao cache da API. "
+            "Use CACHE_BACKEND=redis (ou none)."
+        )
+
+
+async def run_worker_process(
+    concurrency: int = consumer.CONSUMER_CONCURRENCY, metrics_port: int = 0, background_jobs: bool = False,
+) -> bool:
+    """
+    Consome até receber SIGTERM/SIGINT e então drena os lotes em andamento; com
+    `background_jobs`, também disputa as tarefas de manutenção. Retorna False se o consumidor
+    parou sozinho (ex.: falha de conexão).
+    """
+    metrics_server = None
+    if metrics.METRICS_ENABLED:
+        # Tempos das consultas e conexões do pool; a espera pelo pool também alimenta o ajuste do prefetch
+        metrics.instrument_engine(async_engine.sync_engine)
+        if metrics_port:
+            metrics_server = await asyncio.start_server(_serve_metrics, WORKER_METRICS_HOST, metrics_port)
+            logger.info(f"Métricas do processo {os.getpid()} em http://{WORKER_METRICS_HOST}:{metrics_port}/metrics")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+
+    consuming = asyncio.create_task(consumer.consume_checkout_events(stop, concurrency))
+    jobs_task = asyncio.create_task(jobs.run_background_jobs()) if background_jobs else None
+    stopping = asyncio.create_task(stop.wait())
+    await asyncio.wait({consuming, stopping}, return_when=asyncio.FIRST_COMPLETED)
+    stopping.cancel()
+    if stop.is_set():
+        logger.info(f"Sinal de parada recebido (pid {os.getpid()}); terminando os lotes em andamento...")
+        try:
+            await asyncio.wait_for(consuming, consumer.DRAIN_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logger.warning("A drenagem excedeu o tempo limite; as mensagens não confirmadas voltarão para a fila.")
+    if jobs_task is not None:
+        jobs_task.cancel()
+        await asyncio.gather(jobs_task, return_exceptions=True)
+    if metrics_server is not None:
+        metrics_server.close()
+    await async_engine.dispose()
+    return stop.is_set()
+
+
+def _run_child(concurrency: int, metrics_port: int, background_jobs: bool) -> None:
+    # Cada processo (spawn) cria o próprio pool de conexões e a própria conexão com o broker
+    stopped = asyncio.run(run_worker_process(concurrency, metrics_port, background_jobs))
+    sys.exit(0 if stopped else 1)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=WORKER_PROCESSES)
+    parser.add_argument("--concurrency", type=int, default=consumer.CONSUMER_CONCURRENCY)
+    parser.add_argument("--metrics-port", type=int, default=WORKER_METRICS_PORT, help="Porta do primeiro processo; 0 desativa")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    check_shared_cache()
+    context = multiprocessing.get_context("spawn")
+    shutting_down = False
+
+    def request_stop(signum, frame):
+        nonlocal shutting_down
+        shutting_down = True
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    def start(index: int):
+        metrics_port = args.metrics_port + index if args.metrics_port else 0
+        process = context.Process(
+            target=_run_child, args=(args.concurrency, metrics_port, index == 0), name=f"checkout-worker-{index}"
+        )
+        process.start()
+        logger.info(f"Processo consumidor {index} iniciado (pid {process.pid}, consumidores={args.concurrency}).")
+        return process
+
+    processes = {index: start(index) for index in range(max(1, args.processes))}
+    restart_at: dict[int, float] = {}
+    while not shutting_down:
+        for index, process in processes.items():
+            if process.is_alive():
+                continue
+            if index not in restart_at:
+                logger.warning(
+                    f"Processo consumidor {index} (pid {process.pid}) terminou com código {process.exitcode}; "
+                    f"reiniciando em {WORKER_RESTART_DELAY_SECONDS}s."
+                )
+                restart_at[index] = time.monotonic() + WORKER_RESTART_DELAY_SECONDS
+            elif time.monotonic() >= restart_at[index]:
+                del restart_at[index]
+                processes[index] = start(index)
+        time.sleep(0.5)
+
+    # Repassa o SIGTERM (o SIGINT do terminal já chega a todo o grupo de processos)
+    logger.info("Parando os processos consumidores...")
+    for process in processes.values():
+        if process.is_alive():
+            process.terminate()
+    deadline = time.monotonic() + consumer.DRAIN_TIMEOUT_SECONDS + 5
+    for process in processes.values():
+        process.join(max(0.0, deadline - time.monotonic()))
+        if process.is_alive():
+            logger.warning(f"Processo {process.name} (pid {process.pid}) não terminou a tempo; encerrando à força.")
+            process.kill()
+            process.join()
+    logger.info("Processos consumidores parados.")
+
+
+if __name__ == "__main__":
+    main()
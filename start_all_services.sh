@@ -33,6 +33,8 @@ echo "Iniciando o Serviço de Inventário (FastAPI)..."
 cd inventory-service
 # Ative o ambiente virtual Python antes de iniciar o uvicorn
 source venv/Scripts/activate # Use venv\Scripts\activate.bat se estiver em .bat e Windows
+# O schema é criado e atualizado apenas pelas migrações (a API não roda create_all)
+alembic upgrade head
 uvicorn main:app --reload > ../..//inventory-service.log 2>&1 &
 INVENTORY_PID=$!
 deactivate # Desativa o venv após iniciar (o & garante que ele rode em background mesmo assim)